@@ -0,0 +1,36 @@
+# Camada de dados do sistema de empréstimo de notebooks, sem dependência da interface.
+# Importar o pacote não abre o banco: o arquivo é criado/migrado no primeiro acesso
+# (ou em inicializar), e o caminho pode ser trocado antes disso.
+from . import acoes
+from .acoes import NOMES_ACAO, TEXTOS_ACAO, descrever, estruturar_acao
+from .arquivo import DIAS_RETENCAO_LOGS, arquivar_logs, caminho_arquivo, periodos_arquivados, preparar_arquivo
+from .conexao import CAMINHO_BANCO, PERFIS_BANCO, GerenciadorConexoes, banco
+from .datas import FORMATO_DATA, agora_timestamp, formatar_timestamp, para_timestamp
+from .esquema import MIGRACOES, aplicar_migracoes, criar_tabelas, estruturar_logs, versao_esquema
+from .operacoes import (TAMANHO_PAGINA, ErroOperacao, EscritorLogs, MonitorAtrasos, adicionar_notebook,
+                        adicionar_usuario, atualizar_status_notebook, autenticar, buscar_emprestimos,
+                        buscar_emprestimos_pagina, buscar_emprestimos_refinavel, contar_emprestimos_aproximado,
+                        contar_emprestimos_atrasados, criar_admin_padrao, descarregar_logs, devolver_notebook,
+                        editar_notebook_db, editar_usuario_db, efetuar_devolucao, efetuar_emprestimo,
+                        emprestar_notebook, executar_com_repeticao, formatar_emprestimo, iniciar_escritor_logs,
+                        parar_escritor_logs, registrar_acao, registrar_log)
+from .repositorios import (CONSULTAS_INDEXADAS, RepositorioConfiguracoes, RepositorioEmprestimos, RepositorioLogs,
+                           RepositorioNotebooks, RepositorioUsuarios, configuracoes, emprestimos, logs, notebooks, usuarios,
+                           verificar_planos_consultas)
+from .seguranca import (calibrar_custo_bcrypt, custo_bcrypt, custo_do_hash, hash_senha, hash_senhas,
+                        precisa_novo_hash, verificar_senha)
+from .transferencia import (CABECALHO_CSV, IMPORTACOES, ProgressoTarefa, exportar_csv, exportar_incremental,
+                            formato_exportacao, importar_csv)
+
+def _preparar_banco(conexao):
+    criar_tabelas(conexao)
+    aplicar_migracoes(conexao)
+    criar_admin_padrao()
+
+banco.ao_preparar = _preparar_banco
+
+def inicializar(caminho=None, perfil=None):
+    # Opcional: escolhe o arquivo/perfil e prepara o banco agora, em vez de no primeiro acesso
+    banco.configurar(caminho, perfil)
+    banco.escrita
+    return banco
@@ -0,0 +1,5 @@
+import sys
+
+from .transferencia import main
+
+sys.exit(main())
@@ -0,0 +1,69 @@
+import re
+
+# Códigos das ações gravadas em logs_atividade.codigo. Cada log guarda também o alvo da
+# ação (patrimônio e/ou matrícula) em colunas indexadas; o texto fica só para exibição.
+LOGIN = 'login'
+EMPRESTIMO = 'emprestimo'
+DEVOLUCAO = 'devolucao'
+USUARIO_CADASTRADO = 'usuario_cadastrado'
+USUARIO_EDITADO = 'usuario_editado'
+NOTEBOOK_CADASTRADO = 'notebook_cadastrado'
+NOTEBOOK_EDITADO = 'notebook_editado'
+STATUS_NOTEBOOK = 'status_notebook'
+IMPORTACAO = 'importacao'
+ARQUIVAMENTO = 'arquivamento'
+ESTATISTICAS_LOGS = 'estatisticas_logs'
+OUTRA = 'outra'
+
+# Texto exibido de cada ação; {detalhe} é o complemento livre (novo status, resumo)
+TEXTOS_ACAO = {
+    LOGIN: "Login realizado.",
+    EMPRESTIMO: "Empréstimo do notebook {patrimonio} para {matricula}.",
+    DEVOLUCAO: "Devolução do notebook {patrimonio}.",
+    USUARIO_CADASTRADO: "Usuário {matricula} cadastrado.",
+    USUARIO_EDITADO: "Usuário {matricula} editado.",
+    NOTEBOOK_CADASTRADO: "Notebook {patrimonio} cadastrado.",
+    NOTEBOOK_EDITADO: "Notebook {patrimonio} editado.",
+    STATUS_NOTEBOOK: "Status do notebook {patrimonio} alterado para {detalhe}.",
+    IMPORTACAO: "Importação de {detalhe}.",
+    ARQUIVAMENTO: "Arquivamento de {detalhe}.",
+    ESTATISTICAS_LOGS: "Escritor de logs: {detalhe}.",
+    OUTRA: "{detalhe}",
+}
+
+# Nome de cada código no filtro do visualizador de logs
+NOMES_ACAO = {
+    LOGIN: "Login",
+    EMPRESTIMO: "Empréstimo",
+    DEVOLUCAO: "Devolução",
+    USUARIO_CADASTRADO: "Usuário cadastrado",
+    USUARIO_EDITADO: "Usuário editado",
+    NOTEBOOK_CADASTRADO: "Notebook cadastrado",
+    NOTEBOOK_EDITADO: "Notebook editado",
+    STATUS_NOTEBOOK: "Status de notebook",
+    IMPORTACAO: "Importação",
+    ARQUIVAMENTO: "Arquivamento",
+    ESTATISTICAS_LOGS: "Escritor de logs",
+    OUTRA: "Outras",
+}
+
+def descrever(codigo, patrimonio=None, matricula=None, detalhe=None):
+    return TEXTOS_ACAO[codigo].format(patrimonio=patrimonio, matricula=matricula, detalhe=detalhe)
+
+def _padrao(texto):
+    # "Devolução do notebook {patrimonio}." -> regex com grupos nomeados
+    partes = re.split(r'\{(\w+)\}', texto)
+    regex = ''.join(re.escape(parte) if i % 2 == 0 else f'(?P<{parte}>.+?)' for i, parte in enumerate(partes))
+    return re.compile(regex + '$')
+
+# Leitura dos logs em texto livre (anteriores ao código ou gravados sem ele)
+PADROES_ACAO = [(codigo, _padrao(texto)) for codigo, texto in TEXTOS_ACAO.items() if codigo != OUTRA]
+
+def estruturar_acao(texto):
+    # Texto -> (codigo, patrimonio, matricula); o que não reconhece fica como OUTRA
+    for codigo, padrao in PADROES_ACAO:
+        encontrado = padrao.match(texto or '')
+        if encontrado:
+            grupos = encontrado.groupdict()
+            return codigo, grupos.get('patrimonio'), grupos.get('matricula')
+    return OUTRA, None, None
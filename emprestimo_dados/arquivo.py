@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from .conexao import banco
+from .datas import para_timestamp
+from .esquema import estruturar_logs
+from .operacoes import executar_com_repeticao
+from .repositorios import logs
+
+# Retenção dos logs: linhas com mais de DIAS_RETENCAO_LOGS dias saem do banco principal e vão
+# para um banco de arquivo por mês (<banco>_arquivo/logs_AAAA-MM.db), consultado com ATTACH
+DIAS_RETENCAO_LOGS = int(os.environ.get('EMPRESTIMO_DIAS_LOGS', 365))
+LOTE_ARQUIVAMENTO = 2000
+
+def pasta_arquivo():
+    return os.path.splitext(banco.caminho)[0] + '_arquivo'
+
+def caminho_arquivo(periodo):
+    return os.path.join(pasta_arquivo(), f'logs_{periodo}.db')
+
+def periodos_arquivados():
+    # ['AAAA-MM', ...], do mais recente para o mais antigo
+    pasta = pasta_arquivo()
+    if not os.path.isdir(pasta):
+        return []
+    return sorted((nome[5:-3] for nome in os.listdir(pasta) if nome.startswith('logs_') and nome.endswith('.db')), reverse=True)
+
+def criar_tabela_arquivo(conexao):
+    # Mesmas colunas e índices da tabela principal, para os mesmos filtros do visualizador
+    conexao.execute('''CREATE TABLE IF NOT EXISTS logs_atividade (
+                    id INTEGER PRIMARY KEY,
+                    usuario TEXT,
+                    acao TEXT,
+                    data_hora INTEGER)''')
+    conexao.execute("CREATE INDEX IF NOT EXISTS idx_logs_data_hora ON logs_atividade (data_hora)")
+    conexao.execute("CREATE INDEX IF NOT EXISTS idx_logs_usuario_data ON logs_atividade (usuario, data_hora)")
+    # Colunas de código e alvo (arquivos anteriores a elas são convertidos aqui)
+    estruturar_logs(conexao.cursor())
+    conexao.commit()
+
+def _abrir_arquivo(periodo):
+    os.makedirs(pasta_arquivo(), exist_ok=True)
+    conexao = sqlite3.connect(caminho_arquivo(periodo))
+    criar_tabela_arquivo(conexao)
+    return conexao
+
+def preparar_arquivo(periodo):
+    # Antes de consultar um arquivo: converte os gerados antes das colunas de código e alvo
+    _abrir_arquivo(periodo).close()
+    return caminho_arquivo(periodo)
+
+def arquivar_logs(dias=DIAS_RETENCAO_LOGS, tamanho_lote=LOTE_ARQUIVAMENTO, pausa=0.05):
+    # Move em lotes: cada lote é gravado no arquivo do mês (idempotente pelo id) e só depois
+    # apagado do principal numa transação curta. Se o processo cair no meio, a próxima
+    # execução repete o lote sem duplicar. Retorna quantos logs foram movidos.
+    corte = para_timestamp(datetime.now() - timedelta(days=dias))
+    arquivos = {}
+    movidos = 0
+    try:
+        while True:
+            lote = logs.mais_antigos(corte, tamanho_lote)
+            if not lote:
+                break
+            por_periodo = {}
+            for linha in lote:
+                por_periodo.setdefault(datetime.fromtimestamp(linha[3]).strftime('%Y-%m'), []).append(linha)
+            for periodo, linhas in por_periodo.items():
+                if periodo not in arquivos:
+                    arquivos[periodo] = _abrir_arquivo(periodo)
+                with arquivos[periodo]:
+                    arquivos[periodo].executemany("INSERT OR IGNORE INTO logs_atividade (id, usuario, acao, data_hora, codigo, patrimonio, matricula) VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+
+            def apagar():
+                with banco.transacao('IMMEDIATE'):
+                    logs.apagar(linha[0] for linha in lote)
+
+            executar_com_repeticao(apagar)
+            movidos += len(lote)
+            # Libera o lock de escrita para os balcões entre um lote e outro
+            time.sleep(pausa)
+        # Arquivos compactados: sem páginas livres deixadas pelos lotes
+        for conexao in arquivos.values():
+            conexao.execute("VACUUM")
+    finally:
+        for conexao in arquivos.values():
+            conexao.close()
+    return movidos
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Banco de dados (EMPRESTIMO_BANCO troca o arquivo; ver também configurar)
+CAMINHO_BANCO = os.environ.get('EMPRESTIMO_BANCO', 'emprestimo_notebooks.db')
+
+# Perfis de PRAGMAs aplicados a cada conexão (escolhido por EMPRESTIMO_PERFIL_BANCO)
+PERFIS_BANCO = {
+    'padrao': {
+        'synchronous': 'NORMAL',      # seguro em WAL: só perde a última transação em queda de energia
+        'cache_size': -20000,         # ~20 MB de cache de páginas
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,         # ms esperando outro balcão liberar o lock
+        'cached_statements': 256,     # cache de comandos preparados por conexão
+    },
+    'seguro': {
+        'synchronous': 'FULL',
+        'cache_size': -8000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 10000,
+        'cached_statements': 128,
+    },
+}
+
+class GerenciadorConexoes:
+    # Cada thread recebe sua própria conexão de escrita e de leitura em modo WAL:
+    # leituras longas (exportação, logs) não bloqueiam empréstimos e devoluções,
+    # e consultas podem rodar em threads de trabalho sem compartilhar cursores
+    # Nada é aberto na construção: o arquivo só é acessado na primeira conexão, quando
+    # ao_preparar (esquema, migrações) roda uma única vez por processo
+    def __init__(self, caminho=CAMINHO_BANCO, perfil='padrao', ao_preparar=None):
+        self.caminho = caminho
+        self.pragmas = dict(PERFIS_BANCO[perfil])
+        self.cached_statements = self.pragmas.pop('cached_statements', 128)
+        self.ao_preparar = ao_preparar
+        self._preparado = False
+        self._preparando = False
+        self._lock_preparo = threading.RLock()
+        self._local = threading.local()
+        self._abertas = []
+        self._leituras = {}  # ident da thread -> conexão de leitura (ver interromper)
+        self._lock = threading.Lock()
+
+    def configurar(self, caminho=None, perfil=None):
+        if self._abertas:
+            raise RuntimeError("O banco já está aberto; configure antes do primeiro acesso.")
+        if caminho and caminho != self.caminho:
+            self.caminho = caminho
+            self._preparado = False
+        if perfil:
+            self.pragmas = dict(PERFIS_BANCO[perfil])
+            self.cached_statements = self.pragmas.pop('cached_statements', 128)
+
+    def _preparar(self, conexao):
+        # As outras threads esperam no lock até o preparo terminar; a thread que está
+        # preparando passa direto quando abre outras conexões no meio do caminho
+        with self._lock_preparo:
+            if self._preparado or self._preparando:
+                return
+            self._preparando = True
+            try:
+                if self.ao_preparar is not None:
+                    self.ao_preparar(conexao)
+                self._preparado = True
+            finally:
+                self._preparando = False
+
+    def _abrir(self):
+        # check_same_thread=False apenas para permitir fechar tudo em fechar();
+        # cada conexão continua sendo usada somente pela thread que a abriu
+        conexao = sqlite3.connect(self.caminho, cached_statements=self.cached_statements, check_same_thread=False)
+        for nome, valor in self.pragmas.items():
+            conexao.execute(f"PRAGMA {nome} = {valor}")
+        with self._lock:
+            self._abertas.append(conexao)
+        return conexao
+
+    @property
+    def escrita(self):
+        conexao = getattr(self._local, 'escrita', None)
+        if conexao is None:
+            conexao = self._local.escrita = self._abrir()
+            conexao.execute("PRAGMA journal_mode = WAL")
+        if not self._preparado:
+            self._preparar(conexao)
+        return conexao
+
+    @property
+    def leitura(self):
+        conexao = getattr(self._local, 'leitura', None)
+        if conexao is None:
+            self.escrita  # garante que o arquivo exista e já esteja em WAL
+            conexao = self._local.leitura = self._abrir()
+            conexao.execute("PRAGMA query_only = ON")
+            with self._lock:
+                self._leituras[threading.get_ident()] = conexao
+        return conexao
+
+    def interromper(self, thread_ident):
+        # Aborta a consulta em andamento na conexão de leitura de outra thread (ela recebe
+        # sqlite3.OperationalError "interrupted"); sem consulta em andamento não faz nada
+        with self._lock:
+            conexao = self._leituras.get(thread_ident)
+        if conexao is not None:
+            conexao.interrupt()
+
+    @property
+    def consulta(self):
+        # Dentro de uma transação as leituras usam a conexão de escrita,
+        # para enxergar o que a própria transação já gravou
+        if getattr(self._local, 'profundidade', 0):
+            return self.escrita
+        return self.leitura
+
+    @contextmanager
+    def transacao(self, modo='DEFERRED'):
+        # Unidade de trabalho: um único BEGIN/COMMIT para tudo que roda dentro do bloco.
+        # Blocos aninhados participam da transação externa.
+        conexao = self.escrita
+        profundidade = getattr(self._local, 'profundidade', 0)
+        if profundidade:
+            self._local.profundidade += 1
+            try:
+                yield conexao
+            finally:
+                self._local.profundidade -= 1
+            return
+        conexao.execute(f"BEGIN {modo}")
+        self._local.profundidade = 1
+        try:
+            yield conexao
+            conexao.commit()
+        except BaseException:
+            conexao.rollback()
+            raise
+        finally:
+            self._local.profundidade = 0
+
+    @contextmanager
+    def anexar(self, caminho, nome='arquivo'):
+        # Outro arquivo de banco visível como <nome>.tabela na conexão de leitura desta thread
+        conexao = self.leitura
+        conexao.execute(f"ATTACH DATABASE ? AS {nome}", (caminho,))
+        try:
+            yield conexao
+        finally:
+            conexao.execute(f"DETACH DATABASE {nome}")
+
+    def fechar(self):
+        with self._lock:
+            abertas, self._abertas = self._abertas, []
+            self._leituras = {}
+        for conexao in abertas:
+            try:
+                conexao.execute("PRAGMA optimize")
+                conexao.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+banco = GerenciadorConexoes(CAMINHO_BANCO, os.environ.get('EMPRESTIMO_PERFIL_BANCO', 'padrao'))
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+# Datas são gravadas como segundos desde a época (horário local -> epoch)
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+def para_timestamp(data):
+    return int(data.timestamp())
+
+def formatar_timestamp(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).strftime(FORMATO_DATA)
+
+def agora_timestamp():
+    return para_timestamp(datetime.now())
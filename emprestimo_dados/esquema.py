@@ -0,0 +1,221 @@
+import sqlite3
+
+from .acoes import estruturar_acao
+from .operacoes import executar_com_repeticao
+
+def criar_tabelas(conexao):
+    conexao.execute('''CREATE TABLE IF NOT EXISTS usuarios (matricula TEXT PRIMARY KEY, nome TEXT, tipo TEXT, senha TEXT)''')
+    conexao.execute('''CREATE TABLE IF NOT EXISTS notebooks (patrimonio TEXT PRIMARY KEY, marca TEXT, modelo TEXT, status TEXT)''')
+    conexao.execute('''CREATE TABLE IF NOT EXISTS emprestimos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    patrimonio TEXT,
+                    matricula TEXT,
+                    responsavel TEXT,
+                    data_emprestimo INTEGER,
+                    prazo_devolucao INTEGER,
+                    data_devolucao INTEGER,
+                    FOREIGN KEY (patrimonio) REFERENCES notebooks(patrimonio),
+                    FOREIGN KEY (matricula) REFERENCES usuarios(matricula),
+                    FOREIGN KEY (responsavel) REFERENCES usuarios(matricula))''')
+    conexao.execute('''CREATE TABLE IF NOT EXISTS logs_atividade (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario TEXT,
+                    acao TEXT,
+                    data_hora INTEGER)''')
+    conexao.commit()
+
+# Migrações de esquema (versionadas por PRAGMA user_version)
+def _migracao_indices_consultas(cur):
+    # Empréstimos ativos: devolução por patrimônio e contagem de atrasados
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_patrimonio ON emprestimos (patrimonio) WHERE data_devolucao IS NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_prazo ON emprestimos (prazo_devolucao) WHERE data_devolucao IS NULL")
+    # Histórico por notebook (cobre a consulta inteira, sem acessar a tabela)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_patrimonio_data ON emprestimos (patrimonio, data_emprestimo, matricula, data_devolucao)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_data ON emprestimos (data_emprestimo)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_data_hora ON logs_atividade (data_hora)")
+
+def _texto_para_epoch(coluna):
+    # Datas antigas em TEXT estão no horário local; o modificador 'utc' as converte para epoch
+    return f"CASE WHEN typeof({coluna}) = 'text' THEN CAST(strftime('%s', {coluna}, 'utc') AS INTEGER) ELSE {coluna} END"
+
+def _migracao_datas_inteiras(cur):
+    cur.execute('''CREATE TABLE emprestimos_novo (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patrimonio TEXT,
+                matricula TEXT,
+                responsavel TEXT,
+                data_emprestimo INTEGER,
+                prazo_devolucao INTEGER,
+                data_devolucao INTEGER,
+                FOREIGN KEY (patrimonio) REFERENCES notebooks(patrimonio),
+                FOREIGN KEY (matricula) REFERENCES usuarios(matricula),
+                FOREIGN KEY (responsavel) REFERENCES usuarios(matricula))''')
+    cur.execute(f'''INSERT INTO emprestimos_novo (id, patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao, data_devolucao)
+                   SELECT id, patrimonio, matricula, responsavel, {_texto_para_epoch('data_emprestimo')},
+                          {_texto_para_epoch('prazo_devolucao')}, {_texto_para_epoch('data_devolucao')}
+                   FROM emprestimos''')
+    cur.execute("DROP TABLE emprestimos")
+    cur.execute("ALTER TABLE emprestimos_novo RENAME TO emprestimos")
+
+    cur.execute('''CREATE TABLE logs_atividade_novo (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario TEXT,
+                acao TEXT,
+                data_hora INTEGER)''')
+    cur.execute(f'''INSERT INTO logs_atividade_novo (id, usuario, acao, data_hora)
+                   SELECT id, usuario, acao, {_texto_para_epoch('data_hora')} FROM logs_atividade''')
+    cur.execute("DROP TABLE logs_atividade")
+    cur.execute("ALTER TABLE logs_atividade_novo RENAME TO logs_atividade")
+
+    # Os índices caem junto com as tabelas antigas
+    _migracao_indices_consultas(cur)
+
+def _migracao_busca_textual(cur):
+    # Índice FTS5 com tokenizador trigram: busca por substring em patrimônio, matrícula,
+    # responsável e nos nomes do aluno e do responsável. O rowid é o id do empréstimo.
+    try:
+        cur.execute('''CREATE VIRTUAL TABLE emprestimos_busca USING fts5(
+                        patrimonio, matricula, responsavel, nome_aluno, nome_responsavel,
+                        tokenize = 'trigram')''')
+    except sqlite3.OperationalError as e:
+        # SQLite sem FTS5 ("no such module") ou sem o tokenizador trigram (< 3.34): a busca
+        # continua usando LIKE. Qualquer outro erro desfaz a migração.
+        if 'no such module' not in str(e) and 'tokenize' not in str(e):
+            raise
+        return
+    cur.execute('''INSERT INTO emprestimos_busca (rowid, patrimonio, matricula, responsavel, nome_aluno, nome_responsavel)
+                   SELECT e.id, e.patrimonio, e.matricula, e.responsavel, a.nome, r.nome
+                   FROM emprestimos e
+                   LEFT JOIN usuarios a ON a.matricula = e.matricula
+                   LEFT JOIN usuarios r ON r.matricula = e.responsavel''')
+    cur.execute('''CREATE TRIGGER emprestimos_busca_ai AFTER INSERT ON emprestimos BEGIN
+                       INSERT INTO emprestimos_busca (rowid, patrimonio, matricula, responsavel, nome_aluno, nome_responsavel)
+                       VALUES (new.id, new.patrimonio, new.matricula, new.responsavel,
+                               (SELECT nome FROM usuarios WHERE matricula = new.matricula),
+                               (SELECT nome FROM usuarios WHERE matricula = new.responsavel));
+                   END''')
+    cur.execute('''CREATE TRIGGER emprestimos_busca_au AFTER UPDATE OF patrimonio, matricula, responsavel ON emprestimos BEGIN
+                       DELETE FROM emprestimos_busca WHERE rowid = old.id;
+                       INSERT INTO emprestimos_busca (rowid, patrimonio, matricula, responsavel, nome_aluno, nome_responsavel)
+                       VALUES (new.id, new.patrimonio, new.matricula, new.responsavel,
+                               (SELECT nome FROM usuarios WHERE matricula = new.matricula),
+                               (SELECT nome FROM usuarios WHERE matricula = new.responsavel));
+                   END''')
+    cur.execute('''CREATE TRIGGER emprestimos_busca_ad AFTER DELETE ON emprestimos BEGIN
+                       DELETE FROM emprestimos_busca WHERE rowid = old.id;
+                   END''')
+    # Renomear um usuário atualiza os empréstimos em que ele aparece
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_matricula ON emprestimos (matricula)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_responsavel ON emprestimos (responsavel)")
+    cur.execute('''CREATE TRIGGER usuarios_busca_au AFTER UPDATE OF nome ON usuarios BEGIN
+                       UPDATE emprestimos_busca SET nome_aluno = new.nome
+                       WHERE rowid IN (SELECT id FROM emprestimos WHERE matricula = new.matricula);
+                       UPDATE emprestimos_busca SET nome_responsavel = new.nome
+                       WHERE rowid IN (SELECT id FROM emprestimos WHERE responsavel = new.matricula);
+                   END''')
+
+def _migracao_alteracoes_emprestimos(cur):
+    # Quando cada empréstimo foi criado/alterado pela última vez (exportação incremental).
+    # Fica fora de `emprestimos` para não mudar as colunas de SELECT *.
+    cur.execute('''CREATE TABLE emprestimos_alteracoes (
+                    id INTEGER PRIMARY KEY,
+                    modificado_em INTEGER NOT NULL)''')
+    cur.execute('''INSERT INTO emprestimos_alteracoes (id, modificado_em)
+                   SELECT id, coalesce(data_devolucao, data_emprestimo, 0) FROM emprestimos''')
+    cur.execute("CREATE INDEX idx_emprestimos_alteracoes_modificado ON emprestimos_alteracoes (modificado_em)")
+    cur.execute('''CREATE TRIGGER emprestimos_alteracoes_ai AFTER INSERT ON emprestimos BEGIN
+                       INSERT OR REPLACE INTO emprestimos_alteracoes (id, modificado_em)
+                       VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER));
+                   END''')
+    cur.execute('''CREATE TRIGGER emprestimos_alteracoes_au AFTER UPDATE ON emprestimos BEGIN
+                       INSERT OR REPLACE INTO emprestimos_alteracoes (id, modificado_em)
+                       VALUES (new.id, CAST(strftime('%s', 'now') AS INTEGER));
+                   END''')
+    cur.execute('''CREATE TRIGGER emprestimos_alteracoes_ad AFTER DELETE ON emprestimos BEGIN
+                       DELETE FROM emprestimos_alteracoes WHERE id = old.id;
+                   END''')
+    # Marca d'água de cada exportação incremental (por nome de destino)
+    cur.execute('''CREATE TABLE marcas_exportacao (
+                    nome TEXT PRIMARY KEY,
+                    ultimo_id INTEGER,
+                    ultima_modificacao INTEGER,
+                    exportado_em INTEGER)''')
+
+def _migracao_indices_logs(cur):
+    # Filtros do visualizador de logs (por usuário e por prefixo da ação), já na ordem de exibição
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_usuario_data ON logs_atividade (usuario, data_hora)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_acao_data ON logs_atividade (acao, data_hora)")
+
+def estruturar_logs(cur):
+    # Colunas estruturadas dos logs: código da ação e alvo (patrimônio/matrícula), cada um com
+    # índice na ordem de exibição. Os logs em texto já gravados são lidos por estruturar_acao.
+    # Também usada nos arquivos mensais de logs; não faz nada se as colunas já existem.
+    colunas = {linha[1] for linha in cur.execute("PRAGMA table_info(logs_atividade)")}
+    if 'codigo' not in colunas:
+        cur.execute("ALTER TABLE logs_atividade ADD COLUMN codigo TEXT")
+        cur.execute("ALTER TABLE logs_atividade ADD COLUMN patrimonio TEXT")
+        cur.execute("ALTER TABLE logs_atividade ADD COLUMN matricula TEXT")
+        ultimo_id = -1
+        while True:
+            lote = cur.execute("SELECT id, acao FROM logs_atividade WHERE id > ? ORDER BY id LIMIT 5000", (ultimo_id,)).fetchall()
+            if not lote:
+                break
+            cur.executemany("UPDATE logs_atividade SET codigo = ?, patrimonio = ?, matricula = ? WHERE id = ?",
+                            [estruturar_acao(acao) + (id_,) for id_, acao in lote])
+            ultimo_id = lote[-1][0]
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_codigo_data ON logs_atividade (codigo, data_hora)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_patrimonio_data ON logs_atividade (patrimonio, data_hora)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_matricula_data ON logs_atividade (matricula, data_hora)")
+    # O filtro por prefixo do texto deu lugar ao código
+    cur.execute("DROP INDEX IF EXISTS idx_logs_acao_data")
+
+def _migracao_logs_estruturados(cur):
+    estruturar_logs(cur)
+
+def _migracao_configuracoes(cur):
+    # Parâmetros compartilhados por todos os balcões que usam o mesmo banco (ex.: custo do bcrypt)
+    cur.execute('''CREATE TABLE configuracoes (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT)''')
+
+MIGRACOES = [
+    _migracao_indices_consultas,
+    _migracao_datas_inteiras,
+    _migracao_busca_textual,
+    _migracao_alteracoes_emprestimos,
+    _migracao_indices_logs,
+    _migracao_logs_estruturados,
+    _migracao_configuracoes,
+]
+
+def versao_esquema(conexao):
+    return conexao.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migracoes(conexao):
+    # Cada migração roda em BEGIN IMMEDIATE e relê a versão já com o lock: se dois balcões
+    # abrem o banco ao mesmo tempo, um aplica e o outro espera e pula o que já foi feito
+    aplicadas = 0
+    for numero, migracao in enumerate(MIGRACOES, start=1):
+        if versao_esquema(conexao) >= numero:
+            continue
+
+        def passo():
+            cur = conexao.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if versao_esquema(conexao) >= numero:
+                    conexao.rollback()
+                    return 0
+                migracao(cur)
+                cur.execute(f"PRAGMA user_version = {numero}")
+                conexao.commit()
+                return 1
+            except BaseException:
+                conexao.rollback()
+                raise
+
+        aplicadas += executar_com_repeticao(passo)
+    if aplicadas:
+        # Atualiza as estatísticas para o planejador escolher os novos índices
+        conexao.execute("ANALYZE")
+        conexao.commit()
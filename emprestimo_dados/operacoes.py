@@ -0,0 +1,401 @@
+import heapq
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from . import acoes
+from .conexao import banco
+from .datas import agora_timestamp, formatar_timestamp, para_timestamp
+from .repositorios import emprestimos, logs, notebooks, usuarios
+from .seguranca import hash_senha, precisa_novo_hash, verificar_senha
+
+def criar_admin_padrao():
+    # Criar admin padrão se não existir (senha é '123')
+    if usuarios.contar_por_tipo('adm') == 0:
+        senha_admin_hash = hash_senha("123")
+        try:
+            with banco.transacao():
+                usuarios.inserir("admin", "Administrador Padrão", "adm", senha_admin_hash)
+            print("Administrador padrão criado: matrícula=admin, senha=123")
+        except sqlite3.IntegrityError:
+            pass
+
+# Funções de banco de dados
+def adicionar_usuario(matricula, nome, tipo, senha):
+    try:
+        senha_hash = hash_senha(senha)
+        with banco.transacao():
+            usuarios.inserir(matricula, nome, tipo, senha_hash)
+        return True, "Usuário adicionado com sucesso."
+    except sqlite3.IntegrityError:
+        return False, "Erro: A matrícula já existe."
+        
+def editar_usuario_db(matricula, novo_nome, novo_tipo):
+    try:
+        with banco.transacao():
+            usuarios.atualizar(matricula, novo_nome, novo_tipo)
+        return True, "Usuário editado com sucesso."
+    except sqlite3.Error as e:
+        return False, f"Erro ao editar usuário: {e}"
+
+def adicionar_notebook(patrimonio, marca, modelo):
+    try:
+        with banco.transacao():
+            notebooks.inserir(patrimonio, marca, modelo)
+        return True, "Notebook adicionado com sucesso."
+    except sqlite3.IntegrityError:
+        return False, "Erro: O patrimônio já existe."
+
+def editar_notebook_db(patrimonio, nova_marca, novo_modelo, novo_status):
+    try:
+        with banco.transacao():
+            notebooks.atualizar(patrimonio, nova_marca, novo_modelo, novo_status)
+        return True, "Notebook editado com sucesso."
+    except sqlite3.Error as e:
+        return False, f"Erro ao editar notebook: {e}"
+
+def atualizar_status_notebook(patrimonio, status):
+    with banco.transacao():
+        notebooks.atualizar_status(patrimonio, status)
+
+def emprestar_notebook(patrimonio, aluno_matricula, responsavel_matricula, prazo):
+    data_emprestimo = datetime.now()
+    prazo_devolucao = data_emprestimo + timedelta(days=int(prazo))
+    with banco.transacao():
+        emprestimos.inserir(patrimonio, aluno_matricula, responsavel_matricula, para_timestamp(data_emprestimo), para_timestamp(prazo_devolucao))
+
+def devolver_notebook(patrimonio):
+    with banco.transacao():
+        emprestimos.devolver(patrimonio, agora_timestamp())
+
+class ErroOperacao(Exception):
+    pass
+
+def _banco_ocupado(erro):
+    return getattr(erro, 'sqlite_errorcode', None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) or 'locked' in str(erro)
+
+def executar_com_repeticao(operacao, tentativas=6, espera_inicial=0.02):
+    # Repete a operação com backoff exponencial (e jitter) enquanto o banco estiver ocupado
+    espera = espera_inicial
+    for tentativa in range(tentativas):
+        try:
+            return operacao()
+        except sqlite3.OperationalError as e:
+            if not _banco_ocupado(e) or tentativa == tentativas - 1:
+                raise
+            time.sleep(espera * (1 + random.random()))
+            espera *= 2
+
+def efetuar_emprestimo(patrimonio, aluno_matricula, responsavel_matricula, prazo, data_emprestimo=None):
+    # Validação, empréstimo, status e log em uma única transação (um só commit)
+    # O status muda com um UPDATE condicional dentro de BEGIN IMMEDIATE, então
+    # dois balcões nunca emprestam o mesmo notebook
+    def operacao():
+        momento = data_emprestimo or datetime.now()
+        prazo_devolucao = momento + timedelta(days=int(prazo))
+        data_emprestimo_ts = para_timestamp(momento)
+        with banco.transacao('IMMEDIATE'):
+            if not usuarios.existe(aluno_matricula):
+                raise ErroOperacao("Aluno não cadastrado.")
+            if not notebooks.transicionar_status(patrimonio, 'Disponível', 'Emprestado'):
+                status = notebooks.buscar_status(patrimonio)
+                if status is None:
+                    raise ErroOperacao("Notebook não cadastrado.")
+                raise ErroOperacao(f"Este notebook está {status} e não pode ser emprestado.")
+            emprestimos.inserir(patrimonio, aluno_matricula, responsavel_matricula, data_emprestimo_ts, para_timestamp(prazo_devolucao))
+            logs.inserir(responsavel_matricula, acoes.descrever(acoes.EMPRESTIMO, patrimonio, aluno_matricula), data_emprestimo_ts,
+                         acoes.EMPRESTIMO, patrimonio, aluno_matricula)
+
+    try:
+        executar_com_repeticao(operacao)
+        return True, "Notebook emprestado."
+    except ErroOperacao as e:
+        return False, str(e)
+    except sqlite3.Error as e:
+        return False, f"Erro ao registrar empréstimo: {e}"
+
+def efetuar_devolucao(patrimonio, responsavel_matricula):
+    def operacao():
+        agora = agora_timestamp()
+        with banco.transacao('IMMEDIATE'):
+            if not emprestimos.devolver(patrimonio, agora):
+                raise ErroOperacao("Este notebook não está emprestado ou o patrimônio está incorreto.")
+            notebooks.atualizar_status(patrimonio, 'Disponível')
+            logs.inserir(responsavel_matricula, acoes.descrever(acoes.DEVOLUCAO, patrimonio), agora, acoes.DEVOLUCAO, patrimonio)
+
+    try:
+        executar_com_repeticao(operacao)
+        return True, "Notebook devolvido."
+    except ErroOperacao as e:
+        return False, str(e)
+    except sqlite3.Error as e:
+        return False, f"Erro ao registrar devolução: {e}"
+
+def buscar_emprestimos(filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+    return emprestimos.buscar(filtro_texto, filtro_tipo, data_inicio, data_fim)
+
+TAMANHO_PAGINA = 200
+
+def buscar_emprestimos_pagina(filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None, cursor=None, tamanho=TAMANHO_PAGINA):
+    return emprestimos.buscar_pagina(filtro_texto, filtro_tipo, data_inicio, data_fim, cursor, tamanho)
+
+def contar_emprestimos_aproximado(filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+    return emprestimos.contar_aproximado(filtro_texto, filtro_tipo, data_inicio, data_fim)
+
+def buscar_emprestimos_refinavel(filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+    return emprestimos.buscar_refinavel(filtro_texto, filtro_tipo, data_inicio, data_fim)
+
+def contar_emprestimos_atrasados():
+    return emprestimos.contar_atrasados(agora_timestamp())
+
+class MonitorAtrasos:
+    # Contagem de atrasados mantida em memória: um min-heap com os prazos dos empréstimos
+    # ainda no prazo diz quando o próximo vence. Empréstimos e devoluções atualizam a
+    # contagem sem consultar a tabela; entradas de empréstimos já devolvidos saem do
+    # heap só quando chegam ao topo.
+    def __init__(self):
+        self.ativos = {}        # patrimonio -> prazo do empréstimo em aberto
+        self.atrasados = set()  # patrimonios com prazo vencido
+        self._heap = []         # (prazo, patrimonio) ainda não vencidos
+        self.ouvintes = []
+
+    def carregar(self, prazos_ativos, agora=None):
+        self.ativos = dict(prazos_ativos)
+        self.atrasados = set()
+        self._heap = []
+        agora = agora_timestamp() if agora is None else agora
+        for patrimonio, prazo in self.ativos.items():
+            if prazo is not None and prazo < agora:
+                self.atrasados.add(patrimonio)
+            elif prazo is not None:
+                self._heap.append((prazo, patrimonio))
+        heapq.heapify(self._heap)
+        self._notificar()
+
+    @property
+    def contagem(self):
+        return len(self.atrasados)
+
+    def emprestado(self, patrimonio, prazo, agora=None):
+        # Um atraso antigo do mesmo notebook (devolvido em outro balcão) deixa de valer
+        estava_atrasado = patrimonio in self.atrasados
+        self.atrasados.discard(patrimonio)
+        self.ativos[patrimonio] = prazo
+        if prazo < (agora_timestamp() if agora is None else agora):
+            self.atrasados.add(patrimonio)
+            if not estava_atrasado:
+                self._notificar()
+        else:
+            heapq.heappush(self._heap, (prazo, patrimonio))
+            if estava_atrasado:
+                self._notificar()
+
+    def devolvido(self, patrimonio):
+        self.ativos.pop(patrimonio, None)
+        if patrimonio in self.atrasados:
+            self.atrasados.discard(patrimonio)
+            self._notificar()
+
+    def verificar(self, agora=None):
+        # Move para atrasados os empréstimos cujo prazo passou
+        agora = agora_timestamp() if agora is None else agora
+        mudou = False
+        while self._heap and self._heap[0][0] < agora:
+            prazo, patrimonio = heapq.heappop(self._heap)
+            if self.ativos.get(patrimonio) == prazo:
+                self.atrasados.add(patrimonio)
+                mudou = True
+        if mudou:
+            self._notificar()
+
+    def proximo_vencimento(self):
+        # Descarta do topo entradas de empréstimos que já foram devolvidos ou refeitos
+        while self._heap and self.ativos.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _notificar(self):
+        for ouvinte in self.ouvintes:
+            ouvinte(self.contagem)
+
+class EscritorLogs:
+    # Grava os logs em segundo plano: acumula (usuario, acao, data_hora, codigo, patrimonio, matricula) em memória
+    # e grava em lote com executemany a cada `tamanho_lote` registros ou `intervalo_ms`.
+    # Um lote que falha continua na memória e é gravado de novo no próximo intervalo (e em fechar)
+    _FIM = object()
+
+    def __init__(self, banco, tamanho_lote=200, intervalo_ms=500):
+        self.banco = banco
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo_ms / 1000
+        self.fila = queue.Queue()
+        self.fila_maxima = 0
+        self.gravados = 0
+        self.falhas = 0
+        self.ultimo_erro = None
+        self.latencias = deque(maxlen=100)  # segundos por gravação de lote
+        self._lote = []
+        self._aguardando = []  # eventos de descarregar liberados quando o lote for gravado
+        self._falhou = False
+        self._thread = threading.Thread(target=self._executar, name="escritor-logs", daemon=True)
+        self._thread.start()
+
+    def registrar(self, usuario, acao, data_hora=None, codigo=None, patrimonio=None, matricula=None):
+        if codigo is None:
+            codigo, patrimonio, matricula = acoes.estruturar_acao(acao)
+        self.fila.put((usuario, acao, data_hora if data_hora is not None else agora_timestamp(), codigo, patrimonio, matricula))
+        self.fila_maxima = max(self.fila_maxima, self.fila.qsize())
+
+    def descarregar(self, timeout=5):
+        # Bloqueia até que tudo que foi registrado antes desta chamada esteja no banco
+        evento = threading.Event()
+        self.fila.put(evento)
+        return evento.wait(timeout)
+
+    def fechar(self, timeout=5):
+        # Retorna False se sobrou log sem gravar
+        self.fila.put(self._FIM)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        if self._lote:
+            self._gravar()  # última tentativa, já fora da thread do escritor
+        return not self._lote
+
+    def estatisticas(self):
+        latencias = list(self.latencias)
+        return {
+            'fila': self.fila.qsize(),
+            'fila_maxima': self.fila_maxima,
+            'gravados': self.gravados,
+            'nao_gravados': len(self._lote),
+            'falhas': self.falhas,
+            'ultimo_erro': self.ultimo_erro,
+            'latencia_media_ms': 1000 * sum(latencias) / len(latencias) if latencias else 0.0,
+            'latencia_maxima_ms': 1000 * max(latencias) if latencias else 0.0,
+        }
+
+    def _executar(self):
+        prazo = None
+        while True:
+            espera = None if not self._lote else max(0, prazo - time.monotonic())
+            try:
+                item = self.fila.get(timeout=espera)
+            except queue.Empty:
+                item = None
+
+            if item is self._FIM:
+                self._gravar()
+                return
+            if isinstance(item, threading.Event):
+                self._aguardando.append(item)
+                if not self._gravar():
+                    prazo = time.monotonic() + self.intervalo
+                continue
+            if item is not None:
+                if not self._lote:
+                    prazo = time.monotonic() + self.intervalo
+                self._lote.append(item)
+            # Depois de uma falha, só tenta de novo quando o prazo vencer (sem laço quente)
+            if self._lote and (item is None or (len(self._lote) >= self.tamanho_lote and not self._falhou)):
+                if not self._gravar():
+                    prazo = time.monotonic() + self.intervalo
+
+    def _gravar(self):
+        lote = self._lote
+        if lote:
+            inicio = time.perf_counter()
+
+            def operacao():
+                with self.banco.transacao():
+                    logs.inserir_varios(lote)
+
+            try:
+                executar_com_repeticao(operacao)
+            except sqlite3.Error as e:
+                self.falhas += 1
+                self.ultimo_erro = str(e)
+                self._falhou = True
+                return False
+            finally:
+                self.latencias.append(time.perf_counter() - inicio)
+            self.gravados += len(lote)
+            self._lote = []
+            self._falhou = False
+        for evento in self._aguardando:
+            evento.set()
+        self._aguardando = []
+        return True
+
+# Escritor assíncrono opcional (ver iniciar_escritor_logs); sem ele os logs são gravados na hora
+escritor_logs = None
+
+def iniciar_escritor_logs(tamanho_lote=200, intervalo_ms=500):
+    global escritor_logs
+    if escritor_logs is None:
+        escritor_logs = EscritorLogs(banco, tamanho_lote, intervalo_ms)
+    return escritor_logs
+
+def parar_escritor_logs(usuario=None):
+    # Para o escritor e grava as estatísticas da sessão como um log (profundidade da fila e
+    # tempo de gravação dos lotes); esse último log já é gravado direto, sem o escritor
+    global escritor_logs
+    if escritor_logs is None:
+        return True, "Escritor de logs não estava em execução."
+    escritor, escritor_logs = escritor_logs, None
+    tudo_gravado = escritor.fechar()
+    estatisticas = escritor.estatisticas()
+    detalhe = (f"{estatisticas['gravados']} gravado(s), {estatisticas['nao_gravados'] + estatisticas['fila']} não gravado(s), "
+               f"fila máxima {estatisticas['fila_maxima']}, {estatisticas['falhas']} falha(s), "
+               f"lote em {estatisticas['latencia_media_ms']:.1f} ms em média (máx. {estatisticas['latencia_maxima_ms']:.1f} ms)")
+    if estatisticas['ultimo_erro']:
+        detalhe += f", último erro: {estatisticas['ultimo_erro']}"
+    try:
+        registrar_acao(usuario, acoes.ESTATISTICAS_LOGS, detalhe=detalhe)
+    except sqlite3.Error as e:
+        return False, f"Erro ao gravar as estatísticas do escritor de logs: {e}"
+    if not tudo_gravado:
+        return False, f"Escritor de logs: {detalhe}."
+    return True, f"Escritor de logs: {detalhe}."
+
+def descarregar_logs():
+    # Grava os logs ainda na fila do escritor assíncrono (se houver)
+    if escritor_logs is not None:
+        escritor_logs.descarregar()
+
+def registrar_log(usuario, acao, codigo=None, patrimonio=None, matricula=None):
+    # Sem código, o texto da ação é lido por acoes.estruturar_acao (ver registrar_acao)
+    if escritor_logs is not None:
+        escritor_logs.registrar(usuario, acao, None, codigo, patrimonio, matricula)
+        return
+    with banco.transacao():
+        logs.inserir(usuario, acao, agora_timestamp(), codigo, patrimonio, matricula)
+
+def registrar_acao(usuario, codigo, patrimonio=None, matricula=None, detalhe=None):
+    # Log com código e alvo; o texto exibido vem de acoes.TEXTOS_ACAO
+    registrar_log(usuario, acoes.descrever(codigo, patrimonio, matricula, detalhe), codigo, patrimonio, matricula)
+
+def formatar_emprestimo(emprestimo):
+    id_, patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao, data_devolucao = emprestimo
+    return (id_, patrimonio, matricula, responsavel, formatar_timestamp(data_emprestimo),
+            formatar_timestamp(prazo_devolucao), formatar_timestamp(data_devolucao))
+
+def autenticar(matricula, senha):
+    # Consulta + bcrypt: roda fora da thread do Tk
+    usuario = usuarios.buscar(matricula)
+    if usuario and verificar_senha(senha, usuario[3]):
+        # Hash com custo diferente do calibrado: regrava com a senha que acabou de ser conferida
+        if precisa_novo_hash(usuario[3]):
+            novo_hash = hash_senha(senha)
+            try:
+                with banco.transacao():
+                    usuarios.trocar_hash_senha(usuario[0], usuario[3], novo_hash)
+            except sqlite3.Error:
+                pass  # o login não depende da atualização; tenta de novo no próximo
+        registrar_acao(usuario[0], acoes.LOGIN)
+        return usuario
+    return None
@@ -0,0 +1,407 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from .acoes import estruturar_acao
+from .conexao import banco
+from .datas import para_timestamp
+
+# Repositórios: cada método usa a conexão da thread atual e um cursor próprio.
+# Métodos de escrita não fazem commit; quem chama decide a transação (banco.transacao).
+# Limite de parâmetros por consulta (SQLITE_MAX_VARIABLE_NUMBER é 999 em versões antigas)
+MAX_PARAMETROS = 900
+
+def _filtro_periodo(coluna, data_inicio=None, data_fim=None):
+    # Datas no formato AAAA-MM-DD viram um intervalo [início do dia, início do dia seguinte)
+    query = ""
+    params = []
+    if data_inicio:
+        query += f" AND {coluna} >= ?"
+        params.append(para_timestamp(datetime.strptime(data_inicio, '%Y-%m-%d')))
+    if data_fim:
+        query += f" AND {coluna} < ?"
+        params.append(para_timestamp(datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1)))
+    return query, params
+
+def _chaves_existentes(banco, tabela, coluna, chaves):
+    # Quais das chaves já estão cadastradas, consultando a chave primária em blocos
+    chaves = list(chaves)
+    existentes = set()
+    for inicio in range(0, len(chaves), MAX_PARAMETROS):
+        bloco = chaves[inicio:inicio + MAX_PARAMETROS]
+        marcadores = ', '.join('?' * len(bloco))
+        existentes.update(linha[0] for linha in banco.consulta.execute(
+            f"SELECT {coluna} FROM {tabela} WHERE {coluna} IN ({marcadores})", bloco))
+    return existentes
+
+class RepositorioUsuarios:
+    def __init__(self, banco):
+        self.banco = banco
+
+    def buscar(self, matricula):
+        return self.banco.consulta.execute("SELECT * FROM usuarios WHERE matricula = ?", (matricula,)).fetchone()
+
+    def existe(self, matricula):
+        return self.banco.consulta.execute("SELECT 1 FROM usuarios WHERE matricula = ?", (matricula,)).fetchone() is not None
+
+    def listar(self):
+        return self.banco.consulta.execute("SELECT matricula, nome, tipo FROM usuarios").fetchall()
+
+    def buscar_resumo(self, matricula):
+        return self.banco.consulta.execute("SELECT matricula, nome, tipo FROM usuarios WHERE matricula = ?", (matricula,)).fetchone()
+
+    def contar_por_tipo(self, tipo):
+        return self.banco.consulta.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = ?", (tipo,)).fetchone()[0]
+
+    def inserir(self, matricula, nome, tipo, senha_hash):
+        self.banco.escrita.execute("INSERT INTO usuarios VALUES (?, ?, ?, ?)", (matricula, nome, tipo, senha_hash))
+
+    def inserir_varios(self, linhas):
+        self.banco.escrita.executemany("INSERT INTO usuarios VALUES (?, ?, ?, ?)", linhas)
+
+    def existentes(self, matriculas):
+        return _chaves_existentes(self.banco, "usuarios", "matricula", matriculas)
+
+    def atualizar(self, matricula, nome, tipo):
+        self.banco.escrita.execute("UPDATE usuarios SET nome = ?, tipo = ? WHERE matricula = ?", (nome, tipo, matricula))
+
+    def trocar_hash_senha(self, matricula, hash_atual, novo_hash):
+        # Condicional: não sobrescreve uma senha trocada enquanto o novo hash era calculado
+        cur = self.banco.escrita.execute("UPDATE usuarios SET senha = ? WHERE matricula = ? AND senha = ?", (novo_hash, matricula, hash_atual))
+        return cur.rowcount == 1
+
+class RepositorioNotebooks:
+    def __init__(self, banco):
+        self.banco = banco
+
+    def buscar(self, patrimonio):
+        return self.banco.consulta.execute("SELECT patrimonio, marca, modelo, status FROM notebooks WHERE patrimonio = ?", (patrimonio,)).fetchone()
+
+    def buscar_status(self, patrimonio):
+        linha = self.banco.consulta.execute("SELECT status FROM notebooks WHERE patrimonio = ?", (patrimonio,)).fetchone()
+        return linha[0] if linha else None
+
+    def listar(self):
+        return self.banco.consulta.execute("SELECT patrimonio, marca, modelo, status FROM notebooks").fetchall()
+
+    def inserir(self, patrimonio, marca, modelo, status='Disponível'):
+        self.banco.escrita.execute("INSERT INTO notebooks VALUES (?, ?, ?, ?)", (patrimonio, marca, modelo, status))
+
+    def inserir_varios(self, linhas):
+        self.banco.escrita.executemany("INSERT INTO notebooks VALUES (?, ?, ?, ?)", linhas)
+
+    def existentes(self, patrimonios):
+        return _chaves_existentes(self.banco, "notebooks", "patrimonio", patrimonios)
+
+    def atualizar(self, patrimonio, marca, modelo, status):
+        self.banco.escrita.execute("UPDATE notebooks SET marca = ?, modelo = ?, status = ? WHERE patrimonio = ?", (marca, modelo, status, patrimonio))
+
+    def atualizar_status(self, patrimonio, status):
+        self.banco.escrita.execute("UPDATE notebooks SET status = ? WHERE patrimonio = ?", (status, patrimonio))
+
+    def transicionar_status(self, patrimonio, status_atual, novo_status):
+        # Transição condicional: só altera se o status ainda for o esperado.
+        # Retorna False se outro balcão já mudou o notebook.
+        cur = self.banco.escrita.execute("UPDATE notebooks SET status = ? WHERE patrimonio = ? AND status = ?", (novo_status, patrimonio, status_atual))
+        return cur.rowcount == 1
+
+class RepositorioEmprestimos:
+    # O trigram só indexa termos com 3+ caracteres; termos menores usam LIKE
+    TAMANHO_MINIMO_BUSCA_TEXTUAL = 3
+
+    def __init__(self, banco):
+        self.banco = banco
+        self._busca_textual = None
+
+    def tem_busca_textual(self):
+        if self._busca_textual is None:
+            linha = self.banco.consulta.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'emprestimos_busca'").fetchone()
+            self._busca_textual = linha is not None
+        return self._busca_textual
+
+    def inserir(self, patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao):
+        cur = self.banco.escrita.execute("INSERT INTO emprestimos (patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao, data_devolucao) VALUES (?, ?, ?, ?, ?, NULL)",
+                                         (patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao))
+        return cur.lastrowid
+
+    # Os métodos _sql_* montam (sql, params) das consultas que dependem de índice; são os
+    # mesmos usados por verificar_planos_consultas
+    def _sql_devolver(self, patrimonio, data_devolucao):
+        return "UPDATE emprestimos SET data_devolucao = ? WHERE patrimonio = ? AND data_devolucao IS NULL", [data_devolucao, patrimonio]
+
+    def devolver(self, patrimonio, data_devolucao):
+        cur = self.banco.escrita.execute(*self._sql_devolver(patrimonio, data_devolucao))
+        return cur.rowcount
+
+    def _sql_historico(self, patrimonio):
+        return "SELECT data_emprestimo, matricula, data_devolucao FROM emprestimos WHERE patrimonio = ? ORDER BY data_emprestimo DESC", [patrimonio]
+
+    def historico(self, patrimonio):
+        return self.banco.consulta.execute(*self._sql_historico(patrimonio)).fetchall()
+
+    def prazos_ativos(self):
+        # (patrimonio, prazo) de todos os empréstimos em aberto, pelo índice parcial de ativos
+        return self.banco.consulta.execute("SELECT patrimonio, prazo_devolucao FROM emprestimos WHERE data_devolucao IS NULL").fetchall()
+
+    def _sql_contar_atrasados(self, agora):
+        return "SELECT COUNT(*) FROM emprestimos WHERE data_devolucao IS NULL AND prazo_devolucao < ?", [agora]
+
+    def contar_atrasados(self, agora):
+        return self.banco.consulta.execute(*self._sql_contar_atrasados(agora)).fetchone()[0]
+
+    def _filtros(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+        query = " WHERE 1=1"
+        params = []
+
+        if filtro_tipo == 'ativos':
+            query += " AND data_devolucao IS NULL"
+
+        if filtro_texto and len(filtro_texto) >= self.TAMANHO_MINIMO_BUSCA_TEXTUAL and self.tem_busca_textual():
+            # Frase entre aspas = substring exata (sem diferenciar maiúsculas)
+            query += " AND id IN (SELECT rowid FROM emprestimos_busca WHERE emprestimos_busca MATCH ?)"
+            params.append('"' + filtro_texto.replace('"', '""') + '"')
+        elif filtro_texto:
+            query += " AND (patrimonio LIKE ? OR matricula LIKE ? OR responsavel LIKE ?)"
+            params.extend([f'%{filtro_texto}%', f'%{filtro_texto}%', f'%{filtro_texto}%'])
+
+        periodo, params_periodo = _filtro_periodo('data_emprestimo', data_inicio, data_fim)
+        query += periodo
+        params.extend(params_periodo)
+
+        return query, params
+
+    def _sql_buscar(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        return "SELECT * FROM emprestimos" + where, params
+
+    def buscar(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+        return self.banco.consulta.execute(*self._sql_buscar(filtro_texto, filtro_tipo, data_inicio, data_fim)).fetchall()
+
+    def contar(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        return self.banco.consulta.execute("SELECT COUNT(*) FROM emprestimos" + where, params).fetchone()[0]
+
+    def iterar(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None, tamanho_lote=1000):
+        # Gera os empréstimos em lotes (fetchmany), sem carregar a tabela inteira na memória
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        cur = self.banco.consulta.execute("SELECT * FROM emprestimos" + where + " ORDER BY id", params)
+        try:
+            while True:
+                lote = cur.fetchmany(tamanho_lote)
+                if not lote:
+                    return
+                yield lote
+        finally:
+            cur.close()
+
+    def marca_exportacao(self, nome):
+        # (ultimo_id, ultima_modificacao) da exportação anterior; (0, 0) na primeira vez
+        linha = self.banco.consulta.execute("SELECT ultimo_id, ultima_modificacao FROM marcas_exportacao WHERE nome = ?", (nome,)).fetchone()
+        return linha or (0, 0)
+
+    def marca_atual(self, agora):
+        # A marca de tempo fica no segundo anterior: o segundo corrente ainda pode receber
+        # alterações, que saem na próxima exportação
+        return self.banco.consulta.execute("SELECT coalesce(max(id), 0) FROM emprestimos_alteracoes").fetchone()[0], agora - 1
+
+    def gravar_marca_exportacao(self, nome, ultimo_id, ultima_modificacao, exportado_em):
+        self.banco.escrita.execute("INSERT OR REPLACE INTO marcas_exportacao (nome, ultimo_id, ultima_modificacao, exportado_em) VALUES (?, ?, ?, ?)",
+                                   (nome, ultimo_id, ultima_modificacao, exportado_em))
+
+    def _filtro_alterados(self, anterior, atual):
+        # Novos por id ou alterados por data, limitados à marca atual para que o que mudar
+        # durante a exportação fique para a próxima
+        return (" WHERE id IN (SELECT id FROM emprestimos_alteracoes WHERE (id > ? AND id <= ?) OR (modificado_em > ? AND modificado_em <= ?))",
+                [anterior[0], atual[0], anterior[1], atual[1]])
+
+    def contar_alterados(self, anterior, atual):
+        where, params = self._filtro_alterados(anterior, atual)
+        return self.banco.consulta.execute("SELECT COUNT(*) FROM emprestimos" + where, params).fetchone()[0]
+
+    def _sql_alterados(self, anterior, atual):
+        where, params = self._filtro_alterados(anterior, atual)
+        return "SELECT * FROM emprestimos" + where + " ORDER BY id", params
+
+    def iterar_alterados(self, anterior, atual, tamanho_lote=1000):
+        cur = self.banco.consulta.execute(*self._sql_alterados(anterior, atual))
+        try:
+            while True:
+                lote = cur.fetchmany(tamanho_lote)
+                if not lote:
+                    return
+                yield lote
+        finally:
+            cur.close()
+
+    def _sql_pagina(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None, cursor=None, tamanho=200):
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        if cursor:
+            data_emprestimo, id_ = (int(parte) for parte in cursor.split(':'))
+            where += " AND (data_emprestimo, id) < (?, ?)"
+            params.extend([data_emprestimo, id_])
+        return "SELECT * FROM emprestimos" + where + " ORDER BY data_emprestimo DESC, id DESC LIMIT ?", params + [tamanho + 1]
+
+    def buscar_pagina(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None, cursor=None, tamanho=200):
+        # Paginação por chave (keyset) em (data_emprestimo, id), do mais recente para o mais antigo.
+        # O cursor é a chave da última linha da página anterior; o custo não cresce com a página.
+        linhas = self.banco.consulta.execute(*self._sql_pagina(filtro_texto, filtro_tipo, data_inicio, data_fim, cursor, tamanho)).fetchall()
+        proximo = None
+        if len(linhas) > tamanho:
+            linhas = linhas[:tamanho]
+            proximo = f"{linhas[-1][4]}:{linhas[-1][0]}"
+        return linhas, proximo
+
+    def contar_aproximado(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None, limite=10000):
+        # Conta no máximo `limite` linhas; retorna (total, exato)
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        total = self.banco.consulta.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM emprestimos" + where + " LIMIT ?)", params + [limite + 1]).fetchone()[0]
+        return min(total, limite), total <= limite
+
+    def pode_refinar(self, filtro_texto):
+        # Buscas pelo índice trigram são por substring: o resultado de "abcd" está contido no de "abc"
+        return len(filtro_texto) >= self.TAMANHO_MINIMO_BUSCA_TEXTUAL and self.tem_busca_textual()
+
+    def buscar_refinavel(self, filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
+        # Resultado completo com o texto indexado de cada linha, para refinar a busca em memória
+        where, params = self._filtros(filtro_texto, filtro_tipo, data_inicio, data_fim)
+        return self.banco.consulta.execute(
+            "SELECT e.*, b.patrimonio || char(31) || b.matricula || char(31) || b.responsavel || char(31) || "
+            "coalesce(b.nome_aluno, '') || char(31) || coalesce(b.nome_responsavel, '') "
+            "FROM (SELECT * FROM emprestimos" + where + ") AS e JOIN emprestimos_busca b ON b.rowid = e.id "
+            "ORDER BY e.data_emprestimo DESC, e.id DESC", params).fetchall()
+
+class RepositorioLogs:
+    def __init__(self, banco):
+        self.banco = banco
+
+    def inserir(self, usuario, acao, data_hora, codigo=None, patrimonio=None, matricula=None):
+        # Sem código, a ação em texto é lida por estruturar_acao
+        if codigo is None:
+            codigo, patrimonio, matricula = estruturar_acao(acao)
+        self.banco.escrita.execute("INSERT INTO logs_atividade (usuario, acao, data_hora, codigo, patrimonio, matricula) VALUES (?, ?, ?, ?, ?, ?)",
+                                   (usuario, acao, data_hora, codigo, patrimonio, matricula))
+
+    def inserir_varios(self, registros):
+        # registros: (usuario, acao, data_hora, codigo, patrimonio, matricula)
+        self.banco.escrita.executemany("INSERT INTO logs_atividade (usuario, acao, data_hora, codigo, patrimonio, matricula) VALUES (?, ?, ?, ?, ?, ?)", registros)
+
+    def mais_antigos(self, antes_de, limite):
+        return self.banco.consulta.execute("SELECT id, usuario, acao, data_hora, codigo, patrimonio, matricula FROM logs_atividade WHERE data_hora < ? ORDER BY data_hora LIMIT ?",
+                                           (antes_de, limite)).fetchall()
+
+    def apagar(self, ids):
+        self.banco.escrita.executemany("DELETE FROM logs_atividade WHERE id = ?", ((id_,) for id_ in ids))
+
+    @contextmanager
+    def _origem(self, arquivo=None):
+        # Tabela do banco principal ou de um arquivo de logs (anexado só durante a consulta)
+        if arquivo is None:
+            yield self.banco.consulta, "logs_atividade"
+            return
+        with self.banco.anexar(arquivo) as conexao:
+            yield conexao, "arquivo.logs_atividade"
+
+    def _filtros(self, usuario='', codigo='', patrimonio='', matricula='', data_inicio=None, data_fim=None):
+        # Cada filtro tem índice (coluna, data_hora): quem fez (usuario), o que fez (codigo) e
+        # sobre qual notebook/usuário (patrimonio, matricula); o período usa (data_hora)
+        query = " WHERE 1=1"
+        params = []
+        for coluna, valor in (('usuario', usuario), ('codigo', codigo), ('patrimonio', patrimonio), ('matricula', matricula)):
+            if valor:
+                query += f" AND {coluna} = ?"
+                params.append(valor)
+        periodo, params_periodo = _filtro_periodo('data_hora', data_inicio, data_fim)
+        return query + periodo, params + params_periodo
+
+    def _sql_pagina(self, usuario='', codigo='', patrimonio='', matricula='', data_inicio=None, data_fim=None,
+                    cursor=None, tamanho=200, tabela="logs_atividade"):
+        where, params = self._filtros(usuario, codigo, patrimonio, matricula, data_inicio, data_fim)
+        if cursor:
+            data_hora, id_ = (int(parte) for parte in cursor.split(':'))
+            where += " AND (data_hora, id) < (?, ?)"
+            params.extend([data_hora, id_])
+        return (f"SELECT id, data_hora, usuario, acao FROM {tabela}" + where + " ORDER BY data_hora DESC, id DESC LIMIT ?",
+                params + [tamanho + 1])
+
+    def buscar_pagina(self, usuario='', codigo='', patrimonio='', matricula='', data_inicio=None, data_fim=None,
+                      cursor=None, tamanho=200, arquivo=None):
+        # Mais recentes primeiro, paginado por chave (data_hora, id) como em emprestimos.buscar_pagina
+        with self._origem(arquivo) as (conexao, tabela):
+            linhas = conexao.execute(*self._sql_pagina(usuario, codigo, patrimonio, matricula, data_inicio, data_fim,
+                                                       cursor, tamanho, tabela)).fetchall()
+        proximo = None
+        if len(linhas) > tamanho:
+            linhas = linhas[:tamanho]
+            proximo = f"{linhas[-1][1]}:{linhas[-1][0]}"
+        return linhas, proximo
+
+    def contar_aproximado(self, usuario='', codigo='', patrimonio='', matricula='', data_inicio=None, data_fim=None,
+                          limite=10000, arquivo=None):
+        where, params = self._filtros(usuario, codigo, patrimonio, matricula, data_inicio, data_fim)
+        with self._origem(arquivo) as (conexao, tabela):
+            total = conexao.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {tabela}" + where + " LIMIT ?)", params + [limite + 1]).fetchone()[0]
+        return min(total, limite), total <= limite
+
+class RepositorioConfiguracoes:
+    def __init__(self, banco):
+        self.banco = banco
+
+    def ler(self, chave):
+        linha = self.banco.consulta.execute("SELECT valor FROM configuracoes WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def gravar_se_ausente(self, chave, valor):
+        # Retorna o valor que ficou gravado (o de quem gravou primeiro)
+        self.banco.escrita.execute("INSERT OR IGNORE INTO configuracoes (chave, valor) VALUES (?, ?)", (chave, str(valor)))
+        return self.banco.escrita.execute("SELECT valor FROM configuracoes WHERE chave = ?", (chave,)).fetchone()[0]
+
+usuarios = RepositorioUsuarios(banco)
+notebooks = RepositorioNotebooks(banco)
+emprestimos = RepositorioEmprestimos(banco)
+logs = RepositorioLogs(banco)
+configuracoes = RepositorioConfiguracoes(banco)
+
+# Consultas críticas e os índices aceitos para cada uma: o SQL vem dos mesmos métodos
+# _sql_* que os repositórios executam (valores de exemplo nos parâmetros)
+CONSULTAS_INDEXADAS = {
+    'contar_emprestimos_atrasados': (lambda: emprestimos._sql_contar_atrasados(0), ('idx_emprestimos_ativos_prazo',)),
+    'buscar_emprestimos_periodo': (lambda: emprestimos._sql_buscar(data_inicio='2024-01-01', data_fim='2024-01-31'), ('idx_emprestimos_data',)),
+    'buscar_emprestimos_pagina': (lambda: emprestimos._sql_pagina(cursor='0:0'), ('idx_emprestimos_data',)),
+    'efetuar_devolucao': (lambda: emprestimos._sql_devolver('', 0), ('idx_emprestimos_ativos_patrimonio', 'idx_emprestimos_patrimonio_data')),
+    'exibir_historico_notebook': (lambda: emprestimos._sql_historico(''), ('idx_emprestimos_patrimonio_data',)),
+    'exportar_incremental': (lambda: emprestimos._sql_alterados((0, 0), (0, 0)), ('idx_emprestimos_alteracoes_modificado',)),
+    'logs_pagina': (lambda: logs._sql_pagina(cursor='0:0'), ('idx_logs_data_hora',)),
+    'logs_por_usuario': (lambda: logs._sql_pagina(usuario='adm'), ('idx_logs_usuario_data',)),
+    'logs_por_codigo': (lambda: logs._sql_pagina(codigo='login'), ('idx_logs_codigo_data',)),
+    'logs_por_patrimonio': (lambda: logs._sql_pagina(patrimonio='101'), ('idx_logs_patrimonio_data',)),
+    'logs_por_matricula': (lambda: logs._sql_pagina(matricula='101'), ('idx_logs_matricula_data',)),
+}
+
+def _copiar_esquema(conexao):
+    # Banco em memória só com as tabelas e índices de `conexao`, sem dados nem estatísticas:
+    # o plano reflete o esquema, não o tamanho atual das tabelas (num banco pequeno o
+    # planejador prefere varrer a tabela, o que ali é mais barato)
+    copia = sqlite3.connect(':memory:')
+    for tipo, sql in conexao.execute("SELECT type, sql FROM sqlite_master WHERE type IN ('table', 'index') "
+                                     "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type DESC, rowid"):
+        try:
+            copia.execute(sql)
+        except sqlite3.OperationalError:
+            pass  # tabelas internas do FTS5, já criadas junto com a tabela virtual
+    return copia
+
+def verificar_planos_consultas(conexao):
+    # Retorna {nome: plano} das consultas que NÃO usam o índice esperado
+    copia = _copiar_esquema(conexao)
+    falhas = {}
+    try:
+        for nome, (montar, indices) in CONSULTAS_INDEXADAS.items():
+            query, params = montar()
+            plano = [linha[3] for linha in copia.execute("EXPLAIN QUERY PLAN " + query, params)]
+            if not any(f"INDEX {indice}" in detalhe for detalhe in plano for indice in indices):
+                falhas[nome] = plano
+    finally:
+        copia.close()
+    return falhas
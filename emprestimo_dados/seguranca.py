@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+import bcrypt
+
+from .conexao import banco
+from .repositorios import configuracoes
+
+# Funções de segurança
+# Custo do bcrypt calibrado para que uma verificação leve ~EMPRESTIMO_TEMPO_SENHA_MS. A
+# calibração roda uma vez, no primeiro balcão, e fica gravada em `configuracoes`: todos os
+# balcões do mesmo banco usam o mesmo custo (EMPRESTIMO_CUSTO_BCRYPT fixa o custo só neste processo)
+TEMPO_ALVO_SENHA_MS = float(os.environ.get('EMPRESTIMO_TEMPO_SENHA_MS', 250))
+CUSTO_BCRYPT_MINIMO = 10
+CUSTO_BCRYPT_MAXIMO = 16
+_custo_bcrypt = None
+
+def calibrar_custo_bcrypt(alvo_ms=TEMPO_ALVO_SENHA_MS, custo_medido=6):
+    # Mede um custo baixo e extrapola: cada ponto de custo dobra o tempo do bcrypt
+    sal = bcrypt.gensalt(rounds=custo_medido)
+    tempos = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b'calibracao', sal)
+        tempos.append(time.perf_counter() - inicio)
+    ms = min(tempos) * 1000
+    custo = custo_medido
+    while custo < CUSTO_BCRYPT_MAXIMO and ms * 2 <= alvo_ms:
+        ms *= 2
+        custo += 1
+    return max(custo, CUSTO_BCRYPT_MINIMO)
+
+def custo_bcrypt():
+    # Sem lock: se duas threads calibram juntas, o INSERT OR IGNORE guarda um só valor e
+    # as duas leem o mesmo
+    global _custo_bcrypt
+    if _custo_bcrypt is None:
+        fixo = os.environ.get('EMPRESTIMO_CUSTO_BCRYPT')
+        if fixo:
+            _custo_bcrypt = int(fixo)
+        else:
+            # Prepara o banco antes de ler a configuração (o preparo cria o admin padrão,
+            # que volta a chamar esta função)
+            banco.escrita
+            gravado = configuracoes.ler('custo_bcrypt')
+            if gravado is None:
+                custo = calibrar_custo_bcrypt()
+                with banco.transacao('IMMEDIATE'):
+                    gravado = configuracoes.gravar_se_ausente('custo_bcrypt', custo)
+            _custo_bcrypt = int(gravado)
+    return _custo_bcrypt
+
+def custo_do_hash(senha_hash):
+    # "$2b$12$..." -> 12
+    return int(senha_hash.split('$')[2])
+
+def hash_senha(senha):
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds=custo_bcrypt())).decode('utf-8')
+
+def verificar_senha(senha_fornecida, senha_hash):
+    return bcrypt.checkpw(senha_fornecida.encode('utf-8'), senha_hash.encode('utf-8'))
+
+def precisa_novo_hash(senha_hash):
+    return custo_do_hash(senha_hash) != custo_bcrypt()
+
+# O bcrypt libera o GIL: em cadastros em massa as senhas são geradas em paralelo,
+# uma thread por núcleo
+_pool_senhas = None
+_pool_senhas_lock = threading.Lock()
+
+def hash_senhas(senhas):
+    global _pool_senhas
+    with _pool_senhas_lock:
+        if _pool_senhas is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _pool_senhas = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='bcrypt')
+    return list(_pool_senhas.map(hash_senha, senhas))
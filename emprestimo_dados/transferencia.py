@@ -0,0 +1,237 @@
+import csv
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+
+from .conexao import banco
+from .datas import agora_timestamp
+from .operacoes import ErroOperacao, executar_com_repeticao, formatar_emprestimo
+from .repositorios import CONSULTAS_INDEXADAS, emprestimos, notebooks, usuarios, verificar_planos_consultas
+from .seguranca import hash_senhas
+
+CABECALHO_CSV = ['ID', 'Patrimônio', 'Matrícula Aluno', 'Responsável', 'Data Empréstimo', 'Prazo Devolução', 'Data Devolução']
+
+class ProgressoTarefa:
+    # Compartilhado entre a thread de trabalho e a interface (que lê e pode cancelar)
+    def __init__(self):
+        self.total = 0
+        self.processados = 0
+        self.cancelamento = threading.Event()
+        self.inicio = time.monotonic()
+
+    def por_segundo(self):
+        decorrido = time.monotonic() - self.inicio
+        return self.processados / decorrido if decorrido > 0 else 0.0
+
+    def cancelar(self):
+        self.cancelamento.set()
+
+    @property
+    def cancelado(self):
+        return self.cancelamento.is_set()
+
+CAMPOS_JSON = ['id', 'patrimonio', 'matricula', 'responsavel', 'data_emprestimo', 'prazo_devolucao', 'data_devolucao']
+
+def formato_exportacao(arquivo):
+    # 'csv' ou 'jsonl', com ou sem gzip, pela extensão do arquivo
+    nome = arquivo.lower()
+    compactado = nome.endswith('.gz')
+    if compactado:
+        nome = nome[:-3]
+    return ('jsonl' if nome.endswith(('.jsonl', '.json')) else 'csv'), compactado
+
+def _escrever_exportacao(arquivo, lotes, progresso):
+    # Escreve em fluxo, lote a lote, para um arquivo temporário que só substitui o destino
+    # no fim. Retorna quantos empréstimos foram escritos ou None se foi cancelado.
+    formato, compactado = formato_exportacao(arquivo)
+    parcial = arquivo + '.parcial'
+    abrir = gzip.open if compactado else open
+    try:
+        with abrir(parcial, mode='wt', newline='', encoding='utf-8') as f:
+            if formato == 'csv':
+                escritor = csv.writer(f)
+                escritor.writerow(CABECALHO_CSV)
+            for lote in lotes:
+                if progresso.cancelado:
+                    return None
+                if formato == 'csv':
+                    escritor.writerows(formatar_emprestimo(d) for d in lote)
+                else:
+                    f.writelines(json.dumps(dict(zip(CAMPOS_JSON, formatar_emprestimo(d))), ensure_ascii=False) + '\n' for d in lote)
+                progresso.processados += len(lote)
+        os.replace(parcial, arquivo)
+        return progresso.processados
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+
+def exportar_csv(arquivo, filtros=(), progresso=None):
+    # Retorna quantos empréstimos foram exportados (0 = arquivo não criado) ou None se a
+    # exportação foi cancelada
+    progresso = progresso or ProgressoTarefa()
+    progresso.total = emprestimos.contar(*filtros)
+    if progresso.total == 0:
+        return 0
+    return _escrever_exportacao(arquivo, emprestimos.iterar(*filtros), progresso)
+
+def exportar_incremental(arquivo, nome='padrao', progresso=None):
+    # Exporta só os empréstimos criados, devolvidos ou editados desde a última exportação
+    # com o mesmo nome (CSV ou JSON Lines, .gz compacta). A marca d'água só avança depois
+    # que o arquivo foi gravado; sem alterações, nenhum arquivo é criado.
+    progresso = progresso or ProgressoTarefa()
+    anterior = emprestimos.marca_exportacao(nome)
+    atual = emprestimos.marca_atual(agora_timestamp())
+    progresso.total = emprestimos.contar_alterados(anterior, atual)
+    if progresso.total == 0:
+        return 0
+    exportados = _escrever_exportacao(arquivo, emprestimos.iterar_alterados(anterior, atual), progresso)
+    if exportados is not None:
+        with banco.transacao():
+            emprestimos.gravar_marca_exportacao(nome, atual[0], atual[1], agora_timestamp())
+    return exportados
+
+# Importação em massa de CSV (com cabeçalho; nomes de coluna sem diferenciar acentos/maiúsculas)
+TIPOS_USUARIO = ['aluno', 'professor', 'adm']
+STATUS_IMPORTACAO_NOTEBOOK = ['Disponível', 'Em Manutenção', 'Estragado']
+
+def _normalizar_coluna(nome):
+    sem_acentos = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode('ascii')
+    return sem_acentos.strip().lower().replace(' ', '_')
+
+def _validar_notebook(linha):
+    patrimonio, marca, modelo = linha['patrimonio'], linha['marca'], linha['modelo']
+    status = linha.get('status') or 'Disponível'
+    if not patrimonio or not marca or not modelo:
+        return None, "Patrimônio, marca e modelo são obrigatórios."
+    if status not in STATUS_IMPORTACAO_NOTEBOOK:
+        return None, f"Status inválido: {status}."
+    return (patrimonio, marca, modelo, status), None
+
+def _validar_usuario(linha):
+    matricula, nome, tipo, senha = linha['matricula'], linha['nome'], linha['tipo'].lower(), linha['senha']
+    if not matricula or not nome or not tipo or not senha:
+        return None, "Matrícula, nome, tipo e senha são obrigatórios."
+    if tipo not in TIPOS_USUARIO:
+        return None, f"Tipo inválido: {tipo}."
+    return (matricula, nome, tipo, senha), None
+
+def _preparar_usuarios(registros):
+    # Hash do lote inteiro em paralelo; o lote segue direto para o executemany
+    hashes = hash_senhas([senha for _, _, _, senha in registros])
+    return [(matricula, nome, tipo, senha_hash) for (matricula, nome, tipo, _), senha_hash in zip(registros, hashes)]
+
+# tipo: (colunas obrigatórias, validação, preparo de cada lote antes de gravar, repositório)
+IMPORTACOES = {
+    'notebooks': (['patrimonio', 'marca', 'modelo'], _validar_notebook, None, notebooks),
+    'usuarios': (['matricula', 'nome', 'tipo', 'senha'], _validar_usuario, _preparar_usuarios, usuarios),
+}
+
+def _gravar_relatorio_rejeitados(arquivo, colunas, rejeitadas):
+    relatorio = os.path.splitext(arquivo)[0] + '_rejeitados.csv'
+    with open(relatorio, mode='w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['linha', 'motivo'] + colunas)
+        escritor.writerows(rejeitadas)
+    return relatorio
+
+def importar_csv(tipo, arquivo, progresso=None, tamanho_lote=500):
+    # Valida cada linha, rejeita chaves repetidas no arquivo ou já cadastradas e grava em
+    # lotes (executemany, uma transação curta por lote). As linhas rejeitadas vão para
+    # <arquivo>_rejeitados.csv com o número da linha e o motivo.
+    # Retorna (importados, rejeitados, relatorio); relatorio é None sem rejeições.
+    colunas_obrigatorias, validar, preparar, repositorio = IMPORTACOES[tipo]
+    progresso = progresso or ProgressoTarefa()
+    with open(arquivo, newline='', encoding='utf-8-sig') as f:
+        leitor = csv.reader(f)
+        cabecalho = next(leitor, None) or []
+        linhas = list(leitor)
+    colunas = [_normalizar_coluna(nome) for nome in cabecalho]
+    faltando = [nome for nome in colunas_obrigatorias if nome not in colunas]
+    if faltando:
+        raise ErroOperacao(f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}.")
+
+    progresso.total = len(linhas)
+    importados = 0
+    rejeitadas = []
+    vistas = set()
+    for inicio in range(0, len(linhas), tamanho_lote):
+        if progresso.cancelado:
+            break
+        validos = []
+        for numero, valores in enumerate(linhas[inicio:inicio + tamanho_lote], start=inicio + 2):
+            # Linhas curtas ficam com as colunas que faltam vazias (e são rejeitadas na validação)
+            linha = dict.fromkeys(colunas_obrigatorias, '')
+            linha.update((coluna, valor.strip()) for coluna, valor in zip(colunas, valores))
+            registro, motivo = validar(linha)
+            if registro and registro[0] in vistas:
+                registro, motivo = None, "Chave repetida no arquivo."
+            if registro is None:
+                rejeitadas.append([numero, motivo] + valores)
+                continue
+            vistas.add(registro[0])
+            validos.append((numero, valores, registro))
+
+        # Descarta as chaves já cadastradas antes do trabalho caro (hash de senha)
+        existentes = repositorio.existentes(registro[0] for _, _, registro in validos)
+        novos = []
+        for numero, valores, registro in validos:
+            if registro[0] in existentes:
+                rejeitadas.append([numero, "Já cadastrado.", *valores])
+            else:
+                novos.append((numero, valores, registro))
+        registros = [registro for _, _, registro in novos]
+        if preparar:
+            registros = preparar(registros)
+
+        def gravar():
+            # Confere de novo dentro da transação: outro balcão pode ter cadastrado a chave
+            with banco.transacao('IMMEDIATE'):
+                cadastrados = repositorio.existentes(registro[0] for registro in registros)
+                gravados = [registro for registro in registros if registro[0] not in cadastrados]
+                repositorio.inserir_varios(gravados)
+            return cadastrados
+
+        cadastrados = executar_com_repeticao(gravar)
+        for numero, valores, registro in novos:
+            if registro[0] in cadastrados:
+                rejeitadas.append([numero, "Já cadastrado.", *valores])
+        importados += len(registros) - len(cadastrados)
+        progresso.processados = min(inicio + tamanho_lote, len(linhas))
+
+    rejeitadas.sort(key=lambda linha: linha[0])
+    relatorio = _gravar_relatorio_rejeitados(arquivo, cabecalho, rejeitadas) if rejeitadas else None
+    return importados, len(rejeitadas), relatorio
+
+def main(argumentos=None):
+    # Uso sem interface (ex.: tarefas noturnas):
+    #   python -m emprestimo_dados --exportar-incremental ARQUIVO[.csv|.jsonl][.gz] [NOME]
+    #   python -m emprestimo_dados --arquivar-logs [DIAS]
+    #   python -m emprestimo_dados --verificar-planos
+    from .arquivo import DIAS_RETENCAO_LOGS, arquivar_logs
+
+    argumentos = sys.argv[1:] if argumentos is None else argumentos
+    if len(argumentos) >= 2 and argumentos[0] == '--exportar-incremental':
+        exportados = exportar_incremental(argumentos[1], *argumentos[2:3])
+        print(f"{exportados} empréstimo(s) exportado(s).")
+    elif argumentos and argumentos[0] == '--arquivar-logs':
+        movidos = arquivar_logs(int(argumentos[1]) if len(argumentos) > 1 else DIAS_RETENCAO_LOGS)
+        print(f"{movidos} log(s) arquivado(s).")
+    elif argumentos and argumentos[0] == '--verificar-planos':
+        # Confere se cada consulta crítica usa o índice esperado; sai com 1 se alguma não usar
+        falhas = verificar_planos_consultas(banco.consulta)
+        for nome, plano in falhas.items():
+            print(f"{nome}: sem o índice esperado ({'; '.join(plano)})")
+        print(f"{len(CONSULTAS_INDEXADAS) - len(falhas)} de {len(CONSULTAS_INDEXADAS)} consulta(s) usam o índice esperado.")
+        banco.fechar()
+        return 1 if falhas else 0
+    else:
+        print("Uso: python -m emprestimo_dados --exportar-incremental ARQUIVO [NOME]")
+        print("     python -m emprestimo_dados --arquivar-logs [DIAS]")
+        print("     python -m emprestimo_dados --verificar-planos")
+        return 2
+    banco.fechar()
+    return 0
@@ -1,146 +1,446 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
-import csv
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import traceback
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import bcrypt
 from ttkthemes import ThemedTk
 
-# Funções de segurança e banco de dados
-def hash_senha(senha):
-    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verificar_senha(senha_fornecida, senha_hash):
-    return bcrypt.checkpw(senha_fornecida.encode('utf-8'), senha_hash.encode('utf-8'))
-
-# Banco de dados
-conn = sqlite3.connect('emprestimo_notebooks.db')
-c = conn.cursor()
-c.execute('''CREATE TABLE IF NOT EXISTS usuarios (matricula TEXT PRIMARY KEY, nome TEXT, tipo TEXT, senha TEXT)''')
-c.execute('''CREATE TABLE IF NOT EXISTS notebooks (patrimonio TEXT PRIMARY KEY, marca TEXT, modelo TEXT, status TEXT)''')
-c.execute('''CREATE TABLE IF NOT EXISTS emprestimos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patrimonio TEXT,
-                matricula TEXT,
-                responsavel TEXT,
-                data_emprestimo TEXT,
-                prazo_devolucao TEXT,
-                data_devolucao TEXT,
-                FOREIGN KEY (patrimonio) REFERENCES notebooks(patrimonio),
-                FOREIGN KEY (matricula) REFERENCES usuarios(matricula),
-                FOREIGN KEY (responsavel) REFERENCES usuarios(matricula))''')
-c.execute('''CREATE TABLE IF NOT EXISTS logs_atividade (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario TEXT,
-                acao TEXT,
-                data_hora TEXT)''')
-conn.commit()
-
-# Criar admin padrão se não existir (senha é '123')
-c.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = 'adm'")
-if c.fetchone()[0] == 0:
-    senha_admin_hash = hash_senha("123")
-    try:
-        c.execute("INSERT INTO usuarios VALUES (?, ?, ?, ?)", ("admin", "Administrador Padrão", "adm", senha_admin_hash))
-        conn.commit()
-        print("Administrador padrão criado: matrícula=admin, senha=123")
-    except sqlite3.IntegrityError:
-        pass
-
-# Funções de banco de dados
-def adicionar_usuario(matricula, nome, tipo, senha):
-    try:
-        senha_hash = hash_senha(senha)
-        c.execute("INSERT INTO usuarios VALUES (?, ?, ?, ?)", (matricula, nome, tipo, senha_hash))
-        conn.commit()
-        return True, "Usuário adicionado com sucesso."
-    except sqlite3.IntegrityError:
-        return False, "Erro: A matrícula já existe."
-        
-def editar_usuario_db(matricula, novo_nome, novo_tipo):
-    try:
-        c.execute("UPDATE usuarios SET nome = ?, tipo = ? WHERE matricula = ?", (novo_nome, novo_tipo, matricula))
-        conn.commit()
-        return True, "Usuário editado com sucesso."
-    except sqlite3.Error as e:
-        return False, f"Erro ao editar usuário: {e}"
-
-def adicionar_notebook(patrimonio, marca, modelo):
-    try:
-        c.execute("INSERT INTO notebooks VALUES (?, ?, ?, ?)", (patrimonio, marca, modelo, 'Disponível'))
-        conn.commit()
-        return True, "Notebook adicionado com sucesso."
-    except sqlite3.IntegrityError:
-        return False, "Erro: O patrimônio já existe."
-
-def editar_notebook_db(patrimonio, nova_marca, novo_modelo, novo_status):
-    try:
-        c.execute("UPDATE notebooks SET marca = ?, modelo = ?, status = ? WHERE patrimonio = ?", (nova_marca, novo_modelo, novo_status, patrimonio))
-        conn.commit()
-        return True, "Notebook editado com sucesso."
-    except sqlite3.Error as e:
-        return False, f"Erro ao editar notebook: {e}"
-
-def atualizar_status_notebook(patrimonio, status):
-    c.execute("UPDATE notebooks SET status = ? WHERE patrimonio = ?", (status, patrimonio))
-    conn.commit()
-
-def emprestar_notebook(patrimonio, aluno_matricula, responsavel_matricula, prazo):
-    data_emprestimo = datetime.now()
-    prazo_devolucao = data_emprestimo + timedelta(days=int(prazo))
-    c.execute("INSERT INTO emprestimos (patrimonio, matricula, responsavel, data_emprestimo, prazo_devolucao, data_devolucao) VALUES (?, ?, ?, ?, ?, NULL)",
-              (patrimonio, aluno_matricula, responsavel_matricula, data_emprestimo.strftime('%Y-%m-%d %H:%M:%S'), prazo_devolucao.strftime('%Y-%m-%d %H:%M:%S')))
-    conn.commit()
-
-def devolver_notebook(patrimonio):
-    data_devolucao = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute("UPDATE emprestimos SET data_devolucao = ? WHERE patrimonio = ? AND data_devolucao IS NULL", (data_devolucao, patrimonio))
-    conn.commit()
-
-def buscar_emprestimos(filtro_texto='', filtro_tipo='todos', data_inicio=None, data_fim=None):
-    query = "SELECT * FROM emprestimos WHERE 1=1"
-    params = []
-
-    if filtro_tipo == 'ativos':
-        query += " AND data_devolucao IS NULL"
-    
-    if filtro_texto:
-        query += " AND (patrimonio LIKE ? OR matricula LIKE ? OR responsavel LIKE ?)"
-        params.extend([f'%{filtro_texto}%', f'%{filtro_texto}%', f'%{filtro_texto}%'])
-
-    if data_inicio:
-        query += " AND date(data_emprestimo) >= ?"
-        params.append(data_inicio)
-    
-    if data_fim:
-        query += " AND date(data_emprestimo) <= ?"
-        params.append(data_fim)
-
-    c.execute(query, params)
-    return c.fetchall()
-
-def contar_emprestimos_atrasados():
-    hoje = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute("SELECT COUNT(*) FROM emprestimos WHERE data_devolucao IS NULL AND prazo_devolucao < ?", (hoje,))
-    return c.fetchone()[0]
-
-def registrar_log(usuario, acao):
-    data_hora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute("INSERT INTO logs_atividade (usuario, acao, data_hora) VALUES (?, ?, ?)", (usuario, acao, data_hora))
-    conn.commit()
-
-def exportar_csv():
-    dados = buscar_emprestimos()
-    if not dados:
-        messagebox.showinfo("Sem dados", "Nenhum dado encontrado para exportar.")
-        return
-    arquivo = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[["CSV files", "*.csv"]])
-    if arquivo:
-        with open(arquivo, mode='w', newline='', encoding='utf-8') as f:
-            escritor = csv.writer(f)
-            escritor.writerow(['ID', 'Patrimônio', 'Matrícula Aluno', 'Responsável', 'Data Empréstimo', 'Prazo Devolução', 'Data Devolução'])
-            escritor.writerows(dados)
-        messagebox.showinfo("Exportado", "Relatório exportado com sucesso!")
+# Camada de dados (sem Tk); o banco é aberto no primeiro acesso
+from emprestimo_dados import (MonitorAtrasos, ProgressoTarefa, acoes, adicionar_notebook, adicionar_usuario,
+                              agora_timestamp, arquivar_logs, atualizar_status_notebook, autenticar, banco,
+                              caminho_arquivo, periodos_arquivados, preparar_arquivo,
+                              buscar_emprestimos_pagina, buscar_emprestimos_refinavel,
+                              contar_emprestimos_aproximado, descarregar_logs, editar_notebook_db,
+                              editar_usuario_db, efetuar_devolucao, efetuar_emprestimo, emprestimos, exportar_csv,
+                              formatar_emprestimo, formatar_timestamp, importar_csv, iniciar_escritor_logs, logs,
+                              notebooks, para_timestamp, parar_escritor_logs, registrar_acao, usuarios)
+from emprestimo_dados.transferencia import main as linha_de_comando
+
+# Componentes de interface
+
+# Fontes de linhas para a TabelaVirtual: cada linha é (chave, valores, tags)
+class FonteLista:
+    def __init__(self, linhas):
+        self._linhas = list(linhas)
+        self._posicoes = {chave: i for i, (chave, _, _) in enumerate(self._linhas)}
+
+    def total(self):
+        return len(self._linhas)
+
+    def linhas(self, inicio, fim):
+        return self._linhas[inicio:fim]
+
+    def posicao(self, chave):
+        return self._posicoes.get(chave)
+
+    def valores(self, chave):
+        posicao = self._posicoes.get(chave)
+        return self._linhas[posicao][1] if posicao is not None else ()
+
+    def aplicar(self, alteradas=(), removidas=()):
+        # Atualiza linhas pela chave; chaves novas entram no fim
+        for linha in alteradas:
+            posicao = self._posicoes.get(linha[0])
+            if posicao is None:
+                self._posicoes[linha[0]] = len(self._linhas)
+                self._linhas.append(linha)
+            else:
+                self._linhas[posicao] = linha
+        if removidas:
+            removidas = set(removidas)
+            self._linhas = [linha for linha in self._linhas if linha[0] not in removidas]
+            self._posicoes = {chave: i for i, (chave, _, _) in enumerate(self._linhas)}
+
+class FontePaginada:
+    # Busca páginas sob demanda (keyset) conforme o usuário rola; `buscar_pagina(cursor)`
+    # retorna (linhas, proximo_cursor). O total é aproximado até a última página chegar.
+    # As páginas são lidas pelo executor (chave própria da tabela), nunca na thread do Tk:
+    # enquanto não chegam, as posições ainda não carregadas aparecem como "Carregando...".
+    PREFIXO_PROVISORIA = 'carregando-'
+
+    def __init__(self, executor, chave, buscar_pagina, total_aproximado=0, primeira_pagina=None):
+        self._executor = executor
+        self._chave = chave
+        self._buscar_pagina = buscar_pagina
+        self._total_aproximado = total_aproximado
+        self._linhas = []
+        self._posicoes = {}
+        self._cursor = None
+        self._esgotada = False
+        self._carregando = False
+        self._alvo = 0
+        self._ao_carregar = None
+        if primeira_pagina is not None:
+            self._adicionar(*primeira_pagina)
+
+    def observar(self, ao_carregar):
+        self._ao_carregar = ao_carregar
+
+    def _pedir(self, alvo):
+        # Uma tarefa por vez: lê em sequência as páginas até `alvo` linhas (o cursor de uma
+        # página depende da anterior) e entrega todas juntas
+        self._alvo = max(self._alvo, alvo)
+        if self._carregando:
+            return
+        self._carregando = True
+        cursor, carregadas, alvo = self._cursor, len(self._linhas), self._alvo
+
+        def tarefa():
+            paginas = []
+            proximo = cursor
+            quantidade = carregadas
+            while quantidade < alvo:
+                linhas, proximo = self._buscar_pagina(proximo)
+                paginas.append((linhas, proximo))
+                quantidade += len(linhas)
+                if proximo is None:
+                    break
+            return paginas
+
+        self._executor.executar(self._chave, tarefa, ao_concluir=self._paginas_carregadas, ao_falhar=self._falha_ao_carregar,
+                                interrompivel=True)
+
+    def _paginas_carregadas(self, paginas):
+        self._carregando = False
+        for linhas, cursor in paginas:
+            self._adicionar(linhas, cursor)
+        if self._ao_carregar is not None:
+            self._ao_carregar()
+
+    def _falha_ao_carregar(self, erro):
+        # Para de pedir páginas: a tabela fica com o que já foi carregado
+        self._carregando = False
+        self._esgotada = True
+        if self._ao_carregar is not None:
+            self._ao_carregar()
+        messagebox.showerror("Erro", f"Erro ao carregar resultados: {erro}")
+
+    def _adicionar(self, linhas, cursor):
+        self._cursor = cursor
+        for linha in linhas:
+            self._posicoes[linha[0]] = len(self._linhas)
+            self._linhas.append(linha)
+        self._esgotada = self._cursor is None
+
+    def total(self):
+        if self._esgotada:
+            return len(self._linhas)
+        return max(len(self._linhas) + 1, self._total_aproximado)
+
+    def linhas(self, inicio, fim):
+        linhas = self._linhas[inicio:fim]
+        if len(self._linhas) < fim and not self._esgotada:
+            self._pedir(fim)
+            primeira = max(inicio, len(self._linhas))
+            linhas += [(f"{self.PREFIXO_PROVISORIA}{posicao}", ("Carregando...",), ())
+                       for posicao in range(primeira, min(fim, self.total()))]
+        return linhas
+
+    def posicao(self, chave):
+        return self._posicoes.get(chave)
+
+    def valores(self, chave):
+        posicao = self._posicoes.get(chave)
+        return self._linhas[posicao][1] if posicao is not None else ()
+
+class TabelaVirtual:
+    # Treeview que mantém apenas as linhas visíveis como itens do Tk; as demais ficam
+    # na fonte e são trazidas ao rolar. A chave da linha é usada como iid do item.
+    ALTURA_CABECALHO = 25
+
+    def __init__(self, master, columns, **opcoes):
+        self.frame = ttk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=columns, selectmode='browse', **opcoes)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self._rolar)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', expand=True, fill='both')
+
+        self.fonte = FonteLista([])
+        self.inicio = 0
+        self.visiveis = 10
+        self.chave_selecionada = None
+        self._exibidas = {}  # chave -> (valores, tags) dos itens hoje no Treeview
+        self._ordem = []
+
+        self.tree.bind('<Configure>', self._ao_redimensionar)
+        self.tree.bind('<<TreeviewSelect>>', self._ao_selecionar, add='+')
+        for sequencia in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequencia, self._ao_rodar)
+        self.tree.bind('<Up>', lambda e: self._mover_selecao(-1))
+        self.tree.bind('<Down>', lambda e: self._mover_selecao(1))
+        self.tree.bind('<Prior>', lambda e: self._mover_selecao(-self.visiveis))
+        self.tree.bind('<Next>', lambda e: self._mover_selecao(self.visiveis))
+        self.tree.bind('<Home>', lambda e: self._mover_selecao(-self.fonte.total()))
+        self.tree.bind('<End>', lambda e: self._mover_selecao(self.fonte.total()))
+
+    # Repasses para o Treeview interno
+    def pack(self, **opcoes):
+        self.frame.pack(**opcoes)
+
+    def heading(self, coluna, **opcoes):
+        return self.tree.heading(coluna, **opcoes)
+
+    def column(self, coluna, **opcoes):
+        return self.tree.column(coluna, **opcoes)
+
+    def tag_configure(self, tag, **opcoes):
+        return self.tree.tag_configure(tag, **opcoes)
+
+    def bind(self, sequencia, funcao):
+        return self.tree.bind(sequencia, funcao, add='+')
+
+    def focus(self):
+        return self.chave_selecionada or ''
+
+    def selection(self):
+        return (self.chave_selecionada,) if self.chave_selecionada else ()
+
+    def item(self, chave, opcao=None):
+        # A linha selecionada pode ter saído da janela visível; nesse caso vem da fonte
+        if not self.tree.exists(chave) and opcao == 'values':
+            return self.fonte.valores(chave)
+        return self.tree.item(chave, opcao)
+
+    def definir_fonte(self, fonte, manter_posicao=False):
+        self.fonte = fonte
+        if isinstance(fonte, FontePaginada):
+            fonte.observar(lambda: self._pagina_carregada(fonte))
+        if not manter_posicao:
+            self.inicio = 0
+            self.chave_selecionada = None
+        elif self.chave_selecionada is not None and fonte.posicao(self.chave_selecionada) is None:
+            self.chave_selecionada = None
+        self.inicio = self._limitar(self.inicio)
+        self._renderizar()
+
+    def _pagina_carregada(self, fonte):
+        # Troca as linhas provisórias pelas que chegaram (se a fonte ainda é a atual)
+        if fonte is self.fonte:
+            self.inicio = self._limitar(self.inicio)
+            self._renderizar()
+
+    def _provisoria(self, chave):
+        return chave.startswith(FontePaginada.PREFIXO_PROVISORIA)
+
+    def atualizar_linhas(self, alteradas=(), removidas=()):
+        # Atualização pontual: só as linhas indicadas mudam na fonte e no Treeview
+        self.fonte.aplicar(alteradas, removidas)
+        if self.chave_selecionada in set(removidas):
+            self.chave_selecionada = None
+        self.inicio = self._limitar(self.inicio)
+        self._renderizar()
+
+    def _limitar(self, inicio):
+        return max(0, min(inicio, self.fonte.total() - self.visiveis))
+
+    def _ir_para(self, inicio):
+        inicio = self._limitar(inicio)
+        if inicio != self.inicio:
+            self.inicio = inicio
+            self._renderizar()
+
+    def _renderizar(self):
+        # Compara a nova janela com os itens exibidos pela chave e só insere,
+        # altera, move ou remove o que mudou (seleção e foco são preservados)
+        linhas = self.fonte.linhas(self.inicio, self.inicio + self.visiveis)
+        novas = {chave for chave, _, _ in linhas}
+        remover = [chave for chave in self._ordem if chave not in novas]
+        if remover:
+            self.tree.delete(*remover)
+        ordem = [chave for chave in self._ordem if chave in novas]
+        exibidas = {}
+        for indice, (chave, valores, tags) in enumerate(linhas):
+            if chave not in self._exibidas:
+                self.tree.insert('', indice, iid=chave, values=valores, tags=tags)
+                ordem.insert(indice, chave)
+            else:
+                if self._exibidas[chave] != (valores, tags):
+                    self.tree.item(chave, values=valores, tags=tags)
+                if ordem[indice] != chave:
+                    self.tree.move(chave, '', indice)
+                    ordem.remove(chave)
+                    ordem.insert(indice, chave)
+            exibidas[chave] = (valores, tags)
+        self._exibidas = exibidas
+        self._ordem = ordem
+        if self.chave_selecionada is not None and self.chave_selecionada in exibidas and self.tree.selection() != (self.chave_selecionada,):
+            self.tree.selection_set(self.chave_selecionada)
+            self.tree.focus(self.chave_selecionada)
+        self._atualizar_barra()
+
+    def _atualizar_barra(self):
+        total = self.fonte.total()
+        if total <= self.visiveis:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.inicio / total, min(1, (self.inicio + self.visiveis) / total))
+
+    def _rolar(self, acao, quantidade, unidade=None):
+        if acao == 'moveto':
+            self._ir_para(int(float(quantidade) * self.fonte.total()))
+        elif acao == 'scroll':
+            passo = self.visiveis if unidade == 'pages' else 1
+            self._ir_para(self.inicio + int(quantidade) * passo)
+
+    def _ao_rodar(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._ir_para(self.inicio - 3)
+        else:
+            self._ir_para(self.inicio + 3)
+        return 'break'
+
+    def _ao_redimensionar(self, event):
+        altura_linha = int(ttk.Style().lookup('Treeview', 'rowheight') or 0) or 20
+        visiveis = max(1, (event.height - self.ALTURA_CABECALHO) // altura_linha)
+        if visiveis != self.visiveis:
+            self.visiveis = visiveis
+            self.inicio = self._limitar(self.inicio)
+            self._renderizar()
+
+    def _ao_selecionar(self, event):
+        selecao = self.tree.selection()
+        if selecao and not self._provisoria(selecao[0]):
+            self.chave_selecionada = selecao[0]
+        # O Treeview rola sozinho ao selecionar a última linha parcialmente visível
+        self.tree.yview_moveto(0)
+
+    def _mover_selecao(self, deslocamento):
+        total = self.fonte.total()
+        if total == 0:
+            return 'break'
+        atual = self.fonte.posicao(self.chave_selecionada) if self.chave_selecionada is not None else None
+        alvo = 0 if atual is None else max(0, min(total - 1, atual + deslocamento))
+        if alvo < self.inicio:
+            self._ir_para(alvo)
+        elif alvo >= self.inicio + self.visiveis:
+            self._ir_para(alvo - self.visiveis + 1)
+        visiveis = self.tree.get_children()
+        if 0 <= alvo - self.inicio < len(visiveis) and not self._provisoria(visiveis[alvo - self.inicio]):
+            chave = visiveis[alvo - self.inicio]
+            self.chave_selecionada = chave
+            self.tree.selection_set(chave)
+            self.tree.focus(chave)
+        return 'break'
+
+class ExecutorTarefas:
+    # Roda trabalho de banco/CPU em threads e entrega o resultado na thread do Tk:
+    # os resultados vão para uma fila que o loop do Tk esvazia com root.after.
+    # Uma nova tarefa com a mesma chave invalida a anterior (o resultado antigo é descartado).
+    # Tarefas `interrompivel` (consultas de leitura) que já estão rodando são abortadas com
+    # `interromper(ident da thread)`, para não ocupar um worker até o fim à toa.
+    INTERVALO_MS = 16
+    ORCAMENTO_QUADRO = 0.008  # segundos de callbacks por ciclo, para não travar a janela
+
+    def __init__(self, root, ao_mudar_ocupado=None, max_workers=4, interromper=None):
+        self.root = root
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self.interromper = interromper
+        self._em_execucao = {}  # chave -> (geração, ident da thread) das tarefas interrompíveis rodando
+        self._lock_execucao = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarefa")
+        self._resultados = queue.Queue()
+        self._geracoes = {}
+        self._futuros = {}
+        self._unicas = itertools.count()
+        self._agendado = False
+        self._ocupado = False
+
+    def executar(self, chave, funcao, *args, ao_concluir=None, ao_falhar=None, interrompivel=False):
+        # chave=None: tarefa independente, nunca é substituída (ex.: gravações)
+        if chave is None:
+            chave = ('unica', next(self._unicas))
+        geracao = self._geracoes.get(chave, 0) + 1
+        self._geracoes[chave] = geracao
+        anterior = self._futuros.get(chave)
+        if anterior is not None:
+            anterior.cancel()
+        self._interromper(chave)
+        self._futuros[chave] = self._pool.submit(self._rodar, chave, geracao, funcao, args, ao_concluir, ao_falhar, interrompivel)
+        self._atualizar_ocupado()
+        self._agendar()
+
+    def cancelar(self, chave):
+        self._geracoes[chave] = self._geracoes.get(chave, 0) + 1
+        futuro = self._futuros.pop(chave, None)
+        if futuro is not None:
+            futuro.cancel()
+        self._interromper(chave)
+        self._atualizar_ocupado()
+
+    def _interromper(self, chave):
+        with self._lock_execucao:
+            em_execucao = self._em_execucao.pop(chave, None)
+            if em_execucao is not None and self.interromper is not None:
+                self.interromper(em_execucao[1])
+
+    def fechar(self):
+        # Consultas com chave (substituíveis) são descartadas ou interrompidas; as tarefas
+        # independentes (gravações, importações, exportações) já aceitas terminam antes do
+        # banco ser fechado
+        for chave in list(self._futuros):
+            if not (isinstance(chave, tuple) and chave[0] == 'unica'):
+                self.cancelar(chave)
+        self._pool.shutdown(wait=True)
+        self._futuros.clear()
+
+    def _rodar(self, chave, geracao, funcao, args, ao_concluir, ao_falhar, interrompivel=False):
+        if interrompivel:
+            with self._lock_execucao:
+                self._em_execucao[chave] = (geracao, threading.get_ident())
+        try:
+            resultado = (True, funcao(*args))
+        except Exception as e:
+            resultado = (False, e)
+        finally:
+            if interrompivel:
+                with self._lock_execucao:
+                    if self._em_execucao.get(chave, (None,))[0] == geracao:
+                        del self._em_execucao[chave]
+        self._resultados.put((chave, geracao, resultado, ao_concluir, ao_falhar))
+
+    def _agendar(self):
+        if not self._agendado:
+            self._agendado = True
+            self.root.after(self.INTERVALO_MS, self._processar)
+
+    def _processar(self):
+        self._agendado = False
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < self.ORCAMENTO_QUADRO:
+            try:
+                chave, geracao, (sucesso, valor), ao_concluir, ao_falhar = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            if self._geracoes.get(chave) != geracao:
+                continue  # resultado obsoleto: já existe uma tarefa mais nova com essa chave
+            self._futuros.pop(chave, None)
+            try:
+                if sucesso:
+                    if ao_concluir is not None:
+                        ao_concluir(valor)
+                elif ao_falhar is not None:
+                    ao_falhar(valor)
+                else:
+                    messagebox.showerror("Erro", str(valor))
+            except Exception:
+                traceback.print_exc()
+        self._atualizar_ocupado()
+        if self._futuros or not self._resultados.empty():
+            self._agendar()
+
+    def _atualizar_ocupado(self):
+        ocupado = bool(self._futuros)
+        if ocupado != self._ocupado:
+            self._ocupado = ocupado
+            if self.ao_mudar_ocupado is not None:
+                self.ao_mudar_ocupado(ocupado)
 
 # Interface
 class App:
@@ -148,12 +448,27 @@ class App:
         self.root = root
         self.root.title("Sistema de Empréstimo de Notebooks")
         self.usuario_logado = None
+        self.executor = ExecutorTarefas(root, ao_mudar_ocupado=self.indicar_ocupado, interromper=banco.interromper)
+        self.indicador_ocupado = None
+        self.monitor_atrasos = MonitorAtrasos()
+        self.monitor_atrasos.ouvintes.append(self.exibir_atrasos)
+        self.verificacao_prazos = None
+        self.atrasos_label = None
+        # Histórico por notebook: patrimônio -> linhas já formatadas, do menos para o mais recente uso
+        self.cache_historico = OrderedDict()
+        self.historico_agendado = None
         self.login_frame()
 
         self.root.protocol("WM_DELETE_WINDOW", self.fechar_app)
         
     def fechar_app(self):
-        conn.close()
+        if self.verificacao_prazos is not None:
+            self.root.after_cancel(self.verificacao_prazos)
+        self.executor.fechar()
+        sucesso, mensagem = parar_escritor_logs(self.usuario_logado[0] if self.usuario_logado else None)
+        if not sucesso:
+            messagebox.showerror("Erro", mensagem)
+        banco.fechar()
         self.root.destroy()
 
     def login_frame(self):
@@ -172,24 +487,83 @@ class App:
         self.senha_entry.pack(fill='x', pady=(0, 15))
         
         ttk.Button(frame, text="Entrar", command=self.verificar_login).pack(pady=10, fill='x')
+        self.criar_indicador_ocupado()
+
+    def criar_indicador_ocupado(self):
+        # Barra de progresso exibida enquanto houver tarefas em segundo plano
+        self.indicador_ocupado = ttk.Progressbar(self.root, mode='indeterminate', length=120)
+        self.indicar_ocupado(self.executor._ocupado)
+
+    def indicar_ocupado(self, ocupado):
+        self.root.config(cursor='watch' if ocupado else '')
+        if self.indicador_ocupado is None or not self.indicador_ocupado.winfo_exists():
+            return
+        if ocupado:
+            self.indicador_ocupado.pack(side='bottom', anchor='e', padx=10, pady=(0, 5))
+            self.indicador_ocupado.start(15)
+        else:
+            self.indicador_ocupado.stop()
+            self.indicador_ocupado.pack_forget()
 
     def verificar_login(self):
         matricula = self.matricula_entry.get()
         senha = self.senha_entry.get()
-        c.execute("SELECT * FROM usuarios WHERE matricula = ?", (matricula,))
-        usuario = c.fetchone()
-        if usuario and verificar_senha(senha, usuario[3]):
-            self.usuario_logado = usuario
-            registrar_log(self.usuario_logado[0], f"Login realizado.")
-            self.interface_principal()
-            self.verificar_atrasos()
-        else:
-            messagebox.showerror("Erro de Login", "Matrícula ou senha incorreta.")
+
+        def concluir(usuario):
+            if usuario:
+                self.usuario_logado = usuario
+                self.interface_principal()
+                self.verificar_atrasos()
+                if usuario[2] == 'adm':
+                    self.arquivar_logs_antigos()
+            else:
+                messagebox.showerror("Erro de Login", "Matrícula ou senha incorreta.")
+
+        self.executor.executar('login', autenticar, matricula, senha, ao_concluir=concluir)
     
+    def arquivar_logs_antigos(self):
+        # Retenção dos logs em segundo plano, em lotes curtos (não segura os balcões)
+        responsavel = self.usuario_logado[0]
+
+        def tarefa():
+            movidos = arquivar_logs()
+            if movidos:
+                registrar_acao(responsavel, acoes.ARQUIVAMENTO, detalhe=f"{movidos} log(s) antigo(s)")
+            return movidos
+
+        def concluir(movidos):
+            if movidos:
+                self.dados_alterados('logs')
+
+        self.executor.executar('arquivamento', tarefa, ao_concluir=concluir)
+
     def verificar_atrasos(self):
-        atrasados = contar_emprestimos_atrasados()
-        if atrasados > 0:
-            messagebox.showwarning("Aviso de Atraso", f"⚠️ Existem {atrasados} empréstimo(s) atrasado(s)! Verifique a aba de busca ou inventário.")
+        # Uma única leitura dos empréstimos ativos no login; daí em diante o monitor é incremental
+        def concluir(prazos_ativos):
+            self.monitor_atrasos.carregar(prazos_ativos)
+            self.agendar_verificacao_prazos()
+            atrasados = self.monitor_atrasos.contagem
+            if atrasados > 0:
+                messagebox.showwarning("Aviso de Atraso", f"⚠️ Existem {atrasados} empréstimo(s) atrasado(s)! Verifique a aba de busca ou inventário.")
+
+        self.executor.executar('atrasos', emprestimos.prazos_ativos, ao_concluir=concluir)
+
+    def exibir_atrasos(self, atrasados):
+        if self.atrasos_label is not None and self.atrasos_label.winfo_exists():
+            self.atrasos_label.config(text=f"⚠️ {atrasados} empréstimo(s) atrasado(s)!" if atrasados > 0 else "")
+
+    def agendar_verificacao_prazos(self):
+        # Acorda exatamente quando o próximo prazo vence (no máximo a cada minuto)
+        if self.verificacao_prazos is not None:
+            self.root.after_cancel(self.verificacao_prazos)
+        proximo = self.monitor_atrasos.proximo_vencimento()
+        espera_ms = 60000 if proximo is None else min(60000, max(0, proximo - agora_timestamp() + 1) * 1000)
+        self.verificacao_prazos = self.root.after(espera_ms, self.verificar_prazos)
+
+    def verificar_prazos(self):
+        self.verificacao_prazos = None
+        self.monitor_atrasos.verificar()
+        self.agendar_verificacao_prazos()
 
     def interface_principal(self):
         for widget in self.root.winfo_children(): widget.destroy()
@@ -205,6 +579,10 @@ class App:
         self.interface_emprestimo()
         self.interface_busca()
         
+        self.abas = notebook
+        self.abas_adm = {}
+        self.abas_montadas = set()
+        self.abas_desatualizadas = set()
         if self.usuario_logado and self.usuario_logado[2] == 'adm':
             self.aba_inventario = ttk.Frame(notebook)
             self.aba_usuarios = ttk.Frame(notebook)
@@ -212,21 +590,52 @@ class App:
             notebook.add(self.aba_inventario, text="Inventário (ADM)")
             notebook.add(self.aba_usuarios, text="Usuários (ADM)")
             notebook.add(self.aba_logs, text="Logs (ADM)")
-            self.interface_inventario_adm()
-            self.interface_usuarios_adm()
-            self.interface_logs_adm()
+            # Abas de administração são montadas (e carregadas) só quando abertas pela primeira vez
+            self.abas_adm = {
+                'inventario': (self.aba_inventario, self.interface_inventario_adm, self.atualizar_inventario),
+                'usuarios': (self.aba_usuarios, self.interface_usuarios_adm, self.atualizar_usuarios),
+                'logs': (self.aba_logs, self.interface_logs_adm, self.atualizar_logs),
+            }
+            notebook.bind('<<NotebookTabChanged>>', self.ao_trocar_aba)
+        self.criar_indicador_ocupado()
+
+    def aba_visivel(self, nome):
+        return str(self.abas_adm[nome][0]) == self.abas.select()
+
+    def ao_trocar_aba(self, event):
+        for nome, (aba, montar, atualizar) in self.abas_adm.items():
+            if not self.aba_visivel(nome):
+                continue
+            if nome not in self.abas_montadas:
+                self.abas_montadas.add(nome)
+                montar()
+            elif nome in self.abas_desatualizadas:
+                self.abas_desatualizadas.discard(nome)
+                atualizar()
+
+    def dados_alterados(self, *nomes):
+        # Recarrega agora as abas visíveis; as outras ficam marcadas para quando forem abertas
+        for nome in nomes:
+            if nome not in self.abas_montadas:
+                continue
+            if self.aba_visivel(nome):
+                self.abas_adm[nome][2]()
+            else:
+                self.abas_desatualizadas.add(nome)
 
     def interface_emprestimo(self):
         frame = ttk.Frame(self.aba_emprestimo, padding=20)
         frame.pack(expand=True, fill='both')
+        self.atrasos_label = None
 
         if self.usuario_logado and self.usuario_logado[2] not in ('adm', 'professor'):
             ttk.Label(frame, text="Apenas administradores e professores podem realizar empréstimos.", font=('Helvetica', 12, 'bold')).pack(pady=40)
             return
 
-        atrasados = contar_emprestimos_atrasados()
-        if atrasados > 0:
-            ttk.Label(frame, text=f"⚠️ {atrasados} empréstimo(s) atrasado(s)!", foreground="red", font=("Helvetica", 12, "bold")).pack(pady=10)
+        # Atualizado pelo monitor de atrasos (exibir_atrasos)
+        self.atrasos_label = ttk.Label(frame, text="", foreground="red", font=("Helvetica", 12, "bold"))
+        self.atrasos_label.pack(pady=10)
+        self.exibir_atrasos(self.monitor_atrasos.contagem)
         
         input_frame = ttk.Frame(frame)
         input_frame.pack(pady=10)
@@ -266,29 +675,25 @@ class App:
             messagebox.showerror("Erro", "O prazo deve ser um número inteiro.")
             return
 
-        c.execute("SELECT * FROM usuarios WHERE matricula = ?", (aluno_matricula,))
-        if not c.fetchone():
-            messagebox.showerror("Erro", "Aluno não cadastrado.")
-            return
+        data_emprestimo = datetime.now()
 
-        c.execute("SELECT status FROM notebooks WHERE patrimonio = ?", (patrimonio,))
-        notebook = c.fetchone()
-        if not notebook:
-            messagebox.showerror("Erro", "Notebook não cadastrado.")
-            return
-        if notebook[0] != 'Disponível':
-            messagebox.showwarning("Aviso", f"Este notebook está {notebook[0]} e não pode ser emprestado.")
-            return
-
-        emprestar_notebook(patrimonio, aluno_matricula, self.usuario_logado[0], prazo_dias)
-        atualizar_status_notebook(patrimonio, 'Emprestado')
-        registrar_log(self.usuario_logado[0], f"Empréstimo do notebook {patrimonio} para {aluno_matricula}.")
-        messagebox.showinfo("Sucesso", "Notebook emprestado.")
-        self.aluno_entry.delete(0, tk.END)
-        self.pat_entrada.delete(0, tk.END)
-        self.prazo_entry.delete(0, tk.END)
-        self.buscar_resultados()
-        self.atualizar_inventario()
+        def concluir(resultado):
+            success, message = resultado
+            if not success:
+                messagebox.showerror("Erro", message)
+                return
+            self.monitor_atrasos.emprestado(patrimonio, para_timestamp(data_emprestimo + timedelta(days=prazo_dias)))
+            self.agendar_verificacao_prazos()
+            messagebox.showinfo("Sucesso", message)
+            self.aluno_entry.delete(0, tk.END)
+            self.pat_entrada.delete(0, tk.END)
+            self.prazo_entry.delete(0, tk.END)
+            self.buscar_resultados(manter_posicao=True)
+            self.atualizar_notebook(patrimonio)
+            self.invalidar_historico(patrimonio)
+            self.dados_alterados('logs')
+
+        self.executor.executar(None, efetuar_emprestimo, patrimonio, aluno_matricula, self.usuario_logado[0], prazo_dias, data_emprestimo, ao_concluir=concluir)
         
     def realizar_devolucao(self):
         patrimonio = self.pat_entrada.get()
@@ -296,18 +701,20 @@ class App:
             messagebox.showerror("Erro", "Digite o patrimônio para a devolução.")
             return
         
-        c.execute("SELECT * FROM emprestimos WHERE patrimonio = ? AND data_devolucao IS NULL", (patrimonio,))
-        if not c.fetchone():
-            messagebox.showerror("Erro", "Este notebook não está emprestado ou o patrimônio está incorreto.")
-            return
+        def concluir(resultado):
+            success, message = resultado
+            if not success:
+                messagebox.showerror("Erro", message)
+                return
+            self.monitor_atrasos.devolvido(patrimonio)
+            messagebox.showinfo("Sucesso", message)
+            self.pat_entrada.delete(0, tk.END)
+            self.buscar_resultados(manter_posicao=True)
+            self.atualizar_notebook(patrimonio)
+            self.invalidar_historico(patrimonio)
+            self.dados_alterados('logs')
 
-        devolver_notebook(patrimonio)
-        atualizar_status_notebook(patrimonio, 'Disponível')
-        registrar_log(self.usuario_logado[0], f"Devolução do notebook {patrimonio}.")
-        messagebox.showinfo("Sucesso", "Notebook devolvido.")
-        self.pat_entrada.delete(0, tk.END)
-        self.buscar_resultados()
-        self.atualizar_inventario()
+        self.executor.executar(None, efetuar_devolucao, patrimonio, self.usuario_logado[0], ao_concluir=concluir)
 
     def interface_busca(self):
         frame = ttk.Frame(self.aba_busca, padding=20)
@@ -316,9 +723,12 @@ class App:
         search_frame = ttk.Frame(frame)
         search_frame.pack(fill='x', pady=(0, 10))
         
-        ttk.Label(search_frame, text="Buscar por Patrimônio, Matrícula ou Responsável:", font=('Helvetica', 10)).pack(anchor='w', pady=(5, 0))
+        ttk.Label(search_frame, text="Buscar por Patrimônio, Matrícula, Responsável ou Nome:", font=('Helvetica', 10)).pack(anchor='w', pady=(5, 0))
         self.busca_entry = ttk.Entry(search_frame)
         self.busca_entry.pack(fill='x', pady=(0, 10))
+        self.busca_entry.bind('<KeyRelease>', self.agendar_busca)
+        self.busca_agendada = None
+        self.cache_busca = None
         
         data_frame = ttk.Frame(search_frame)
         data_frame.pack(fill='x', pady=(5, 0))
@@ -342,7 +752,7 @@ class App:
         ttk.Radiobutton(filtro_frame, text="Todos os Empréstimos", variable=self.filtro_var, value="todos", command=self.buscar_resultados).pack(side='left', padx=5)
         ttk.Button(filtro_frame, text="Buscar", command=self.buscar_resultados).pack(side='right', padx=5)
 
-        self.tabela = ttk.Treeview(frame, columns=("id", "patrimonio", "matricula", "responsavel", "data_emprestimo", "prazo", "devolucao"), show="headings")
+        self.tabela = TabelaVirtual(frame, columns=("id", "patrimonio", "matricula", "responsavel", "data_emprestimo", "prazo", "devolucao"), show="headings")
         self.tabela.heading("id", text="ID")
         self.tabela.heading("patrimonio", text="Patrimônio")
         self.tabela.heading("matricula", text="Matrícula do Aluno")
@@ -351,55 +761,224 @@ class App:
         self.tabela.heading("prazo", text="Prazo de Devolução")
         self.tabela.heading("devolucao", text="Data da Devolução")
         self.tabela.pack(expand=True, fill="both")
+        self.tabela.tag_configure('atrasado', background='red', foreground='white')
+
+        rodape_frame = ttk.Frame(frame)
+        rodape_frame.pack(fill='x', pady=10)
+        self.busca_total_label = ttk.Label(rodape_frame, text="", font=('Helvetica', 10))
+        self.busca_total_label.pack(side='left')
+        ttk.Button(rodape_frame, text="Exportar CSV", command=self.exportar_csv).pack(side='right')
 
-        ttk.Button(frame, text="Exportar CSV", command=exportar_csv).pack(pady=10, side='right')
         self.buscar_resultados()
         
-    def buscar_resultados(self):
-        for row in self.tabela.get_children():
-            self.tabela.delete(row)
-        
+    # Busca ao digitar: espera uma pausa na digitação antes de consultar
+    ATRASO_BUSCA_MS = 120
+    # Resultados completos até este tamanho ficam em memória para refinar a busca
+    LIMITE_CACHE_BUSCA = 2000
+
+    def agendar_busca(self, event=None):
+        if event is not None and event.keysym in ('Up', 'Down', 'Left', 'Right', 'Home', 'End', 'Tab'):
+            return
+        if self.busca_agendada is not None:
+            self.root.after_cancel(self.busca_agendada)
+        self.busca_agendada = self.root.after(self.ATRASO_BUSCA_MS, self.busca_ao_digitar)
+
+    def busca_ao_digitar(self):
+        self.busca_agendada = None
+        filtros = self.ler_filtros_busca(avisar=False)
+        if filtros is None:
+            return
+        texto = filtros[0]
+        cache = self.cache_busca
+        # Se o novo texto só estreita o anterior, filtra o resultado já carregado
+        if (cache is not None and cache['filtros'][1:] == filtros[1:] and emprestimos.pode_refinar(texto)
+                and cache['texto'].lower() in texto.lower()):
+            self.executor.cancelar('busca')
+            procurado = texto.lower()
+            linhas = [linha for linha, indexado in cache['linhas'] if procurado in indexado]
+            self.busca_total_label.config(text=f"{len(linhas)} empréstimo(s) encontrado(s)")
+            self.tabela.definir_fonte(FonteLista(linhas))
+            return
+        self.buscar_resultados(filtros=filtros)
+
+    def ler_filtros_busca(self, avisar=True):
         filtro_texto = self.busca_entry.get()
         filtro_tipo = self.filtro_var.get()
-        data_inicio = self.data_inicio_entry.get()
-        data_fim = self.data_fim_entry.get()
-        
+        periodo = self.ler_periodo(self.data_inicio_entry.get(), self.data_fim_entry.get(), avisar)
+        if periodo is None:
+            return None
+        return (filtro_texto, filtro_tipo) + periodo
+
+    def ler_periodo(self, data_inicio, data_fim, avisar=True):
+        # Valida as datas AAAA-MM-DD (vazias = sem limite); retorna (início, fim) ou None
         if data_inicio:
             try:
                 datetime.strptime(data_inicio, '%Y-%m-%d')
             except ValueError:
-                messagebox.showerror("Erro", "Formato de data de início inválido. Use AAAA-MM-DD.")
-                return
+                if avisar:
+                    messagebox.showerror("Erro", "Formato de data de início inválido. Use AAAA-MM-DD.")
+                return None
         
         if data_fim:
             try:
                 datetime.strptime(data_fim, '%Y-%m-%d')
             except ValueError:
-                messagebox.showerror("Erro", "Formato de data de fim inválido. Use AAAA-MM-DD.")
-                return
+                if avisar:
+                    messagebox.showerror("Erro", "Formato de data de fim inválido. Use AAAA-MM-DD.")
+                return None
 
         if data_inicio and data_fim:
             if datetime.strptime(data_inicio, '%Y-%m-%d') > datetime.strptime(data_fim, '%Y-%m-%d'):
-                messagebox.showwarning("Aviso", "A data de início não pode ser depois da data de fim. Invertendo as datas.")
+                if avisar:
+                    messagebox.showwarning("Aviso", "A data de início não pode ser depois da data de fim. Invertendo as datas.")
                 data_inicio, data_fim = data_fim, data_inicio
 
-        resultados = buscar_emprestimos(filtro_texto, filtro_tipo, data_inicio, data_fim)
-        
-        if not resultados:
-            print("Nenhum empréstimo encontrado com os filtros fornecidos.")
+        return (data_inicio, data_fim)
+
+    def buscar_resultados(self, manter_posicao=False, filtros=None):
+        if not manter_posicao:
+            self.tabela.definir_fonte(FonteLista([]))
+            self.busca_total_label.config(text="")
 
-        hoje = datetime.now()
-        for r in resultados:
+        if filtros is None:
+            filtros = self.ler_filtros_busca()
+            if filtros is None:
+                return
+
+        agora = agora_timestamp()
+
+        def linha_tabela(r):
             tags = ()
-            if r[6] is None:
-                try:
-                    prazo = datetime.strptime(r[5], '%Y-%m-%d %H:%M:%S')
-                    if hoje > prazo:
-                        tags = ('atrasado',)
-                except ValueError:
-                    pass
-            self.tabela.insert('', 'end', values=r, tags=tags)
-        self.tabela.tag_configure('atrasado', background='red', foreground='white')
+            if r[6] is None and r[5] is not None and r[5] < agora:
+                tags = ('atrasado',)
+            return (str(r[0]), formatar_emprestimo(r[:7]), tags)
+
+        # As páginas só são buscadas quando a rolagem chega nelas
+        def buscar_pagina(cursor):
+            resultados, proximo = buscar_emprestimos_pagina(*filtros, cursor=cursor)
+            return [linha_tabela(r) for r in resultados], proximo
+
+        # Contagem e primeira página em segundo plano; as seguintes vêm ao rolar.
+        # Resultados de busca textual pequenos vêm inteiros, para refinar em memória.
+        def tarefa():
+            total, exato = contar_emprestimos_aproximado(*filtros)
+            if exato and total <= self.LIMITE_CACHE_BUSCA and emprestimos.pode_refinar(filtros[0]):
+                completos = [(linha_tabela(r), r[7].lower()) for r in buscar_emprestimos_refinavel(*filtros)]
+                return (total, exato), None, completos
+            return (total, exato), buscar_pagina(None), None
+
+        def concluir(resultado):
+            (total, exato), primeira_pagina, completos = resultado
+            if total == 0:
+                print("Nenhum empréstimo encontrado com os filtros fornecidos.")
+            self.busca_total_label.config(text=f"{total}{'' if exato else '+'} empréstimo(s) encontrado(s)")
+            if completos is not None:
+                self.cache_busca = {'filtros': filtros, 'texto': filtros[0], 'linhas': completos}
+                self.tabela.definir_fonte(FonteLista(linha for linha, _ in completos), manter_posicao=manter_posicao)
+            else:
+                self.cache_busca = None
+                self.tabela.definir_fonte(FontePaginada(self.executor, ('paginas', 'busca'), buscar_pagina, total, primeira_pagina),
+                                         manter_posicao=manter_posicao)
+
+        self.executor.executar('busca', tarefa, ao_concluir=concluir, interrompivel=True)
+
+    def exportar_csv(self):
+        # Exporta o que os filtros da aba Buscar selecionam
+        filtros = self.ler_filtros_busca()
+        if filtros is None:
+            return
+        arquivo = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[["CSV files", "*.csv"], ["CSV gzip", "*.csv.gz"], ["JSON Lines", "*.jsonl"], ["JSON Lines gzip", "*.jsonl.gz"]])
+        if not arquivo:
+            return
+
+        progresso = ProgressoTarefa()
+        fechar_janela = self.janela_progresso("Exportando CSV", progresso, "empréstimo(s)")
+
+        def concluir(exportados):
+            fechar_janela()
+            if exportados is None:
+                messagebox.showinfo("Cancelado", "Exportação cancelada.")
+            elif exportados == 0:
+                messagebox.showinfo("Sem dados", "Nenhum dado encontrado para exportar.")
+            else:
+                messagebox.showinfo("Exportado", f"Relatório exportado com sucesso! ({exportados} empréstimo(s))")
+
+        def falhar(erro):
+            fechar_janela()
+            messagebox.showerror("Erro", f"Erro ao exportar: {erro}")
+
+        # Cada exportação é independente (chave None): uma segunda não descarta o resultado da primeira
+        self.executor.executar(None, exportar_csv, arquivo, filtros, progresso, ao_concluir=concluir, ao_falhar=falhar)
+
+    def janela_progresso(self, titulo, progresso, unidade):
+        # Janela com barra de progresso e botão Cancelar; retorna a função que a fecha
+        win = tk.Toplevel(self.root)
+        win.title(titulo)
+        frame = ttk.Frame(win, padding=20)
+        frame.pack(expand=True, fill='both')
+        status_label = ttk.Label(frame, text="Preparando...", font=('Helvetica', 10))
+        status_label.pack(anchor='w', pady=(0, 5))
+        barra = ttk.Progressbar(frame, mode='determinate', length=300)
+        barra.pack(fill='x', pady=(0, 10))
+
+        def fechar():
+            if win.winfo_exists():
+                win.destroy()
+
+        def cancelar():
+            # A tarefa para no próximo lote e ainda informa o resultado; a janela fecha já
+            progresso.cancelar()
+            fechar()
+
+        ttk.Button(frame, text="Cancelar", command=cancelar).pack(fill='x')
+        win.protocol("WM_DELETE_WINDOW", cancelar)
+
+        def acompanhar():
+            if not win.winfo_exists():
+                return
+            if progresso.total:
+                barra.config(maximum=progresso.total, value=progresso.processados)
+                status_label.config(text=f"{progresso.processados} de {progresso.total} {unidade} ({progresso.por_segundo():.0f}/s)")
+            win.after(100, acompanhar)
+
+        acompanhar()
+        return fechar
+
+    def importar_csv_interface(self, tipo):
+        arquivo = filedialog.askopenfilename(filetypes=[["CSV files", "*.csv"]])
+        if not arquivo:
+            return
+
+        responsavel = self.usuario_logado[0]
+        progresso = ProgressoTarefa()
+        fechar_janela = self.janela_progresso(f"Importando {tipo}", progresso, "linha(s)")
+
+        def tarefa():
+            importados, rejeitados, relatorio = importar_csv(tipo, arquivo, progresso)
+            # Vazão em cadastros por segundo (para usuários, dominada pelo bcrypt)
+            taxa = importados / max(time.monotonic() - progresso.inicio, 1e-6)
+            if importados:
+                registrar_acao(responsavel, acoes.IMPORTACAO,
+                               detalhe=f"{tipo}: {importados} cadastrado(s), {rejeitados} rejeitado(s), {taxa:.1f}/s")
+            return importados, rejeitados, relatorio, taxa
+
+        def concluir(resultado):
+            fechar_janela()
+            importados, rejeitados, relatorio, taxa = resultado
+            mensagem = f"{importados} {tipo} importado(s) ({taxa:.1f} {tipo}/s), {rejeitados} rejeitado(s)."
+            if progresso.cancelado:
+                mensagem = "Importação cancelada. " + mensagem
+            if relatorio:
+                mensagem += f"\nLinhas rejeitadas: {relatorio}"
+            messagebox.showinfo("Importação", mensagem)
+            self.dados_alterados('inventario' if tipo == 'notebooks' else 'usuarios', 'logs')
+
+        def falhar(erro):
+            fechar_janela()
+            messagebox.showerror("Erro", f"Erro ao importar: {erro}")
+
+        # Cada importação é independente: uma segunda não descarta o resumo (já gravado) da primeira
+        self.executor.executar(None, tarefa, ao_concluir=concluir, ao_falhar=falhar)
 
     def interface_inventario_adm(self):
         frame = ttk.Frame(self.aba_inventario, padding=20)
@@ -411,17 +990,19 @@ class App:
         cadastro_frame.columnconfigure(0, weight=1)
         cadastro_frame.columnconfigure(1, weight=1)
         cadastro_frame.columnconfigure(2, weight=1)
+        cadastro_frame.columnconfigure(3, weight=1)
         
         ttk.Button(cadastro_frame, text="Cadastrar Notebook", command=self.adicionar_notebook_interface).grid(row=0, column=0, padx=5, pady=5, sticky='ew')
         ttk.Button(cadastro_frame, text="Alterar Status", command=self.alterar_status_notebook_interface).grid(row=0, column=1, padx=5, pady=5, sticky='ew')
         ttk.Button(cadastro_frame, text="Editar Notebook", command=self.editar_notebook_interface).grid(row=0, column=2, padx=5, pady=5, sticky='ew')
+        ttk.Button(cadastro_frame, text="Importar CSV", command=lambda: self.importar_csv_interface('notebooks')).grid(row=0, column=3, padx=5, pady=5, sticky='ew')
 
         ttk.Separator(frame, orient='horizontal').pack(fill='x', pady=20)
 
         inventario_frame = ttk.LabelFrame(frame, text="Inventário de Notebooks", padding=10)
         inventario_frame.pack(expand=True, fill='both')
         
-        self.inventario_tabela = ttk.Treeview(inventario_frame, columns=("patrimonio", "marca", "modelo", "status"), show="headings")
+        self.inventario_tabela = TabelaVirtual(inventario_frame, columns=("patrimonio", "marca", "modelo", "status"), show="headings")
         self.inventario_tabela.heading("patrimonio", text="Patrimônio")
         self.inventario_tabela.heading("marca", text="Marca")
         self.inventario_tabela.heading("modelo", text="Modelo")
@@ -449,16 +1030,18 @@ class App:
         
         cadastro_frame.columnconfigure(0, weight=1)
         cadastro_frame.columnconfigure(1, weight=1)
+        cadastro_frame.columnconfigure(2, weight=1)
 
         ttk.Button(cadastro_frame, text="Cadastrar Novo Usuário", command=self.adicionar_usuario_interface).grid(row=0, column=0, padx=5, pady=5, sticky='ew')
         ttk.Button(cadastro_frame, text="Editar Usuário", command=self.editar_usuario_interface).grid(row=0, column=1, padx=5, pady=5, sticky='ew')
+        ttk.Button(cadastro_frame, text="Importar CSV", command=lambda: self.importar_csv_interface('usuarios')).grid(row=0, column=2, padx=5, pady=5, sticky='ew')
         
         ttk.Separator(frame, orient='horizontal').pack(fill='x', pady=20)
 
         usuarios_frame = ttk.LabelFrame(frame, text="Lista de Usuários", padding=10)
         usuarios_frame.pack(expand=True, fill='both')
         
-        self.usuarios_tabela = ttk.Treeview(usuarios_frame, columns=("matricula", "nome", "tipo"), show="headings")
+        self.usuarios_tabela = TabelaVirtual(usuarios_frame, columns=("matricula", "nome", "tipo"), show="headings")
         self.usuarios_tabela.heading("matricula", text="Matrícula")
         self.usuarios_tabela.heading("nome", text="Nome")
         self.usuarios_tabela.heading("tipo", text="Tipo")
@@ -466,60 +1049,197 @@ class App:
 
         self.atualizar_usuarios()
 
+    # Filtro de ação dos logs: nome exibido -> código gravado em logs_atividade
+    CODIGOS_ACAO_LOG = {"Todas": '', **{nome: codigo for codigo, nome in acoes.NOMES_ACAO.items()}}
+
     def interface_logs_adm(self):
         frame = ttk.Frame(self.aba_logs, padding=20)
         frame.pack(expand=True, fill='both')
         ttk.Label(frame, text="Logs de Atividade", font=('Helvetica', 14, 'bold')).pack(pady=10)
-        self.logs_tabela = ttk.Treeview(frame, columns=("data_hora", "usuario", "acao"), show="headings")
+
+        filtro_frame = ttk.Frame(frame)
+        filtro_frame.pack(fill='x', pady=(0, 10))
+        ttk.Label(filtro_frame, text="Usuário:", font=('Helvetica', 10)).grid(row=0, column=0, sticky='w')
+        self.logs_usuario_entry = ttk.Entry(filtro_frame, width=15)
+        self.logs_usuario_entry.grid(row=0, column=1, padx=5, sticky='ew')
+        ttk.Label(filtro_frame, text="Ação:", font=('Helvetica', 10)).grid(row=0, column=2, sticky='w')
+        self.logs_acao_var = tk.StringVar(value="Todas")
+        ttk.Combobox(filtro_frame, textvariable=self.logs_acao_var, values=list(self.CODIGOS_ACAO_LOG), state='readonly',
+                     width=15).grid(row=0, column=3, padx=5, sticky='ew')
+        # Alvo da ação: todas as ações sobre um notebook ou sobre um usuário
+        ttk.Label(filtro_frame, text="Patrimônio:", font=('Helvetica', 10)).grid(row=1, column=0, sticky='w', pady=(5, 0))
+        self.logs_patrimonio_entry = ttk.Entry(filtro_frame, width=15)
+        self.logs_patrimonio_entry.grid(row=1, column=1, padx=5, pady=(5, 0), sticky='ew')
+        ttk.Label(filtro_frame, text="Matrícula:", font=('Helvetica', 10)).grid(row=1, column=2, sticky='w', pady=(5, 0))
+        self.logs_matricula_entry = ttk.Entry(filtro_frame, width=15)
+        self.logs_matricula_entry.grid(row=1, column=3, padx=5, pady=(5, 0), sticky='ew')
+        ttk.Label(filtro_frame, text="De (AAAA-MM-DD):", font=('Helvetica', 10)).grid(row=2, column=0, sticky='w', pady=(5, 0))
+        self.logs_inicio_entry = ttk.Entry(filtro_frame, width=15)
+        self.logs_inicio_entry.grid(row=2, column=1, padx=5, pady=(5, 0), sticky='ew')
+        ttk.Label(filtro_frame, text="Até (AAAA-MM-DD):", font=('Helvetica', 10)).grid(row=2, column=2, sticky='w', pady=(5, 0))
+        self.logs_fim_entry = ttk.Entry(filtro_frame, width=15)
+        self.logs_fim_entry.grid(row=2, column=3, padx=5, pady=(5, 0), sticky='ew')
+        ttk.Label(filtro_frame, text="Período:", font=('Helvetica', 10)).grid(row=3, column=0, sticky='w', pady=(5, 0))
+        # "Atual" é o banco principal; os demais são os arquivos mensais de logs antigos
+        self.logs_periodo_var = tk.StringVar(value="Atual")
+        self.logs_periodo_combo = ttk.Combobox(filtro_frame, textvariable=self.logs_periodo_var, state='readonly', width=15,
+                                               values=["Atual"] + periodos_arquivados(),
+                                               postcommand=lambda: self.logs_periodo_combo.config(values=["Atual"] + periodos_arquivados()))
+        self.logs_periodo_combo.grid(row=3, column=1, padx=5, pady=(5, 0), sticky='ew')
+        self.logs_periodo_combo.bind('<<ComboboxSelected>>', lambda event: self.atualizar_logs(manter_posicao=False))
+        ttk.Button(filtro_frame, text="Filtrar", command=lambda: self.atualizar_logs(manter_posicao=False)).grid(row=0, column=4, rowspan=4, padx=5, sticky='ns')
+        filtro_frame.columnconfigure(1, weight=1)
+        filtro_frame.columnconfigure(3, weight=1)
+
+        self.logs_tabela = TabelaVirtual(frame, columns=("data_hora", "usuario", "acao"), show="headings")
         self.logs_tabela.heading("data_hora", text="Data e Hora")
         self.logs_tabela.heading("usuario", text="Usuário")
         self.logs_tabela.heading("acao", text="Ação")
         self.logs_tabela.pack(expand=True, fill="both")
+        self.logs_total_label = ttk.Label(frame, text="", font=('Helvetica', 10))
+        self.logs_total_label.pack(anchor='w', pady=(10, 0))
         self.atualizar_logs()
         
     def atualizar_inventario(self):
-        for row in self.inventario_tabela.get_children():
-            self.inventario_tabela.delete(row)
-        
-        c.execute("SELECT patrimonio, marca, modelo, status FROM notebooks")
-        todos_notebooks = c.fetchall()
-        
-        for notebook in todos_notebooks:
-            self.inventario_tabela.insert('', 'end', values=notebook)
+        # Recarregar o inventário descarta também os históricos guardados (outro balcão pode ter mudado)
+        self.cache_historico.clear()
+
+        def tarefa():
+            return [(notebook[0], notebook, ()) for notebook in notebooks.listar()]
+
+        self.executor.executar('inventario', tarefa,
+                               ao_concluir=lambda linhas: self.inventario_tabela.definir_fonte(FonteLista(linhas), manter_posicao=True))
 
     def atualizar_usuarios(self):
-        for row in self.usuarios_tabela.get_children():
-            self.usuarios_tabela.delete(row)
-        c.execute("SELECT matricula, nome, tipo FROM usuarios")
-        todos_usuarios = c.fetchall()
-        for usuario in todos_usuarios:
-            self.usuarios_tabela.insert('', 'end', values=usuario)
-
-    def exibir_historico_notebook(self, event):
+        def tarefa():
+            return [(usuario[0], usuario, ()) for usuario in usuarios.listar()]
+
+        self.executor.executar('usuarios', tarefa,
+                               ao_concluir=lambda linhas: self.usuarios_tabela.definir_fonte(FonteLista(linhas), manter_posicao=True))
+
+    def atualizar_notebook(self, patrimonio):
+        # Recarrega só a linha do notebook alterado
+        if not hasattr(self, 'inventario_tabela'):
+            return
+
+        def concluir(notebook):
+            if notebook:
+                self.inventario_tabela.atualizar_linhas([(notebook[0], notebook, ())])
+            else:
+                self.inventario_tabela.atualizar_linhas(removidas=[patrimonio])
+
+        self.executor.executar(('notebook', patrimonio), notebooks.buscar, patrimonio, ao_concluir=concluir)
+
+    def atualizar_usuario(self, matricula):
+        if not hasattr(self, 'usuarios_tabela'):
+            return
+
+        def concluir(usuario):
+            if usuario:
+                self.usuarios_tabela.atualizar_linhas([(usuario[0], usuario, ())])
+            else:
+                self.usuarios_tabela.atualizar_linhas(removidas=[matricula])
+
+        self.executor.executar(('usuario', matricula), usuarios.buscar_resumo, matricula, ao_concluir=concluir)
+
+    # Histórico do notebook selecionado: espera a seleção parar (setas no inventário) e
+    # guarda os últimos TAMANHO_CACHE_HISTORICO notebooks consultados
+    ATRASO_HISTORICO_MS = 100
+    TAMANHO_CACHE_HISTORICO = 64
+
+    def exibir_historico_notebook(self, event=None):
+        if self.historico_agendado is not None:
+            self.root.after_cancel(self.historico_agendado)
+        self.historico_agendado = self.root.after(self.ATRASO_HISTORICO_MS, self.carregar_historico)
+
+    def carregar_historico(self):
+        self.historico_agendado = None
         item_selecionado = self.inventario_tabela.focus()
         if not item_selecionado:
             return
-        
         patrimonio = self.inventario_tabela.item(item_selecionado, 'values')[0]
-        
-        for row in self.tabela_historico.get_children():
-            self.tabela_historico.delete(row)
 
-        c.execute("SELECT data_emprestimo, matricula, data_devolucao FROM emprestimos WHERE patrimonio = ? ORDER BY data_emprestimo DESC", (patrimonio,))
-        historico = c.fetchall()
-        
-        for h in historico:
-            self.tabela_historico.insert('', 'end', values=h)
+        if patrimonio in self.cache_historico:
+            self.cache_historico.move_to_end(patrimonio)
+            self.executor.cancelar('historico')
+            self.mostrar_historico(self.cache_historico[patrimonio])
+            return
 
-    def atualizar_logs(self):
-        for row in self.logs_tabela.get_children():
-            self.logs_tabela.delete(row)
-        
-        c.execute("SELECT data_hora, usuario, acao FROM logs_atividade ORDER BY data_hora DESC")
-        logs = c.fetchall()
-        
-        for log in logs:
-            self.logs_tabela.insert('', 'end', values=log)
+        def tarefa():
+            return [(formatar_timestamp(data_emprestimo), matricula, formatar_timestamp(data_devolucao))
+                    for data_emprestimo, matricula, data_devolucao in emprestimos.historico(patrimonio)]
+
+        def concluir(linhas):
+            self.cache_historico[patrimonio] = linhas
+            if len(self.cache_historico) > self.TAMANHO_CACHE_HISTORICO:
+                self.cache_historico.popitem(last=False)
+            self.mostrar_historico(linhas)
+
+        # Seleções rápidas substituem a consulta anterior: só a última é exibida
+        self.executor.executar('historico', tarefa, ao_concluir=concluir)
+
+    def mostrar_historico(self, linhas):
+        self.tabela_historico.delete(*self.tabela_historico.get_children())
+        for valores in linhas:
+            self.tabela_historico.insert('', 'end', values=valores)
+
+    def invalidar_historico(self, patrimonio):
+        # Empréstimo/devolução do notebook: descarta o histórico guardado e uma consulta em
+        # andamento (que pode ter lido o banco antes da gravação); recarrega se estiver à vista
+        self.cache_historico.pop(patrimonio, None)
+        self.executor.cancelar('historico')
+        if 'inventario' in self.abas_montadas and self.inventario_tabela.focus() == patrimonio:
+            self.exibir_historico_notebook()
+
+    def atualizar_logs(self, manter_posicao=True):
+        # Só a contagem (limitada) e a primeira página são lidas; o resto vem ao rolar
+        periodo = self.ler_periodo(self.logs_inicio_entry.get(), self.logs_fim_entry.get())
+        if periodo is None:
+            return
+        filtros = (self.logs_usuario_entry.get().strip(), self.CODIGOS_ACAO_LOG.get(self.logs_acao_var.get(), ''),
+                   self.logs_patrimonio_entry.get().strip(), self.logs_matricula_entry.get().strip()) + periodo
+        periodo_arquivo = self.logs_periodo_var.get()
+        arquivo = None if periodo_arquivo == "Atual" else caminho_arquivo(periodo_arquivo)
+
+        def buscar_pagina(cursor):
+            linhas, proximo = logs.buscar_pagina(*filtros, cursor=cursor, arquivo=arquivo)
+            return [(str(id_), (formatar_timestamp(data_hora), usuario, acao), ()) for id_, data_hora, usuario, acao in linhas], proximo
+
+        def tarefa():
+            descarregar_logs()
+            if arquivo:
+                preparar_arquivo(periodo_arquivo)
+            return logs.contar_aproximado(*filtros, arquivo=arquivo), buscar_pagina(None)
+
+        def concluir(resultado):
+            (total, exato), primeira_pagina = resultado
+            self.logs_total_label.config(text=f"{total}{'' if exato else '+'} registro(s)")
+            self.logs_tabela.definir_fonte(FontePaginada(self.executor, ('paginas', 'logs'), buscar_pagina, total, primeira_pagina),
+                                          manter_posicao=manter_posicao)
+
+        self.executor.executar('logs', tarefa, ao_concluir=concluir, interrompivel=True)
+
+    def salvar_em_segundo_plano(self, operacao, acao_log, ao_sucesso):
+        # Grava (e registra o log) fora da thread do Tk; a resposta volta pelo executor.
+        # acao_log: argumentos de registrar_acao (codigo, patrimonio, matricula, detalhe)
+        responsavel = self.usuario_logado[0]
+
+        def tarefa():
+            success, message = operacao()
+            if success:
+                registrar_acao(responsavel, **acao_log)
+            return success, message
+
+        def concluir(resultado):
+            success, message = resultado
+            if success:
+                messagebox.showinfo("Sucesso", message)
+                ao_sucesso()
+                self.dados_alterados('logs')
+            else:
+                messagebox.showerror("Erro", message)
+
+        self.executor.executar(None, tarefa, ao_concluir=concluir)
 
     def adicionar_usuario_interface(self):
         win = tk.Toplevel(self.root)
@@ -549,14 +1269,11 @@ class App:
             if not matricula or not nome or not tipo or not senha:
                 messagebox.showerror("Erro", "Todos os campos devem ser preenchidos.")
                 return
-            success, message = adicionar_usuario(matricula, nome, tipo, senha)
-            if success:
-                messagebox.showinfo("Sucesso", message)
-                registrar_log(self.usuario_logado[0], f"Usuário {matricula} cadastrado.")
+            def concluido():
                 win.destroy()
-                self.atualizar_usuarios()
-            else:
-                messagebox.showerror("Erro", message)
+                self.atualizar_usuario(matricula)
+
+            self.salvar_em_segundo_plano(lambda: adicionar_usuario(matricula, nome, tipo, senha), dict(codigo=acoes.USUARIO_CADASTRADO, matricula=matricula), concluido)
 
         ttk.Button(frame, text="Salvar", command=salvar).pack(pady=10, fill='x')
 
@@ -597,14 +1314,11 @@ class App:
                 messagebox.showerror("Erro", "O nome não pode ser vazio.")
                 return
 
-            success, message = editar_usuario_db(matricula, novo_nome, novo_tipo)
-            if success:
-                messagebox.showinfo("Sucesso", message)
-                registrar_log(self.usuario_logado[0], f"Usuário {matricula} editado.")
+            def concluido():
                 win.destroy()
-                self.atualizar_usuarios()
-            else:
-                messagebox.showerror("Erro", message)
+                self.atualizar_usuario(matricula)
+
+            self.salvar_em_segundo_plano(lambda: editar_usuario_db(matricula, novo_nome, novo_tipo), dict(codigo=acoes.USUARIO_EDITADO, matricula=matricula), concluido)
         
         ttk.Button(frame, text="Salvar Alterações", command=salvar_edicao).pack(pady=10, fill='x')
 
@@ -632,14 +1346,11 @@ class App:
             if not patrimonio or not marca or not modelo:
                 messagebox.showerror("Erro", "Todos os campos de notebook devem ser preenchidos.")
                 return
-            success, message = adicionar_notebook(patrimonio, marca, modelo)
-            if success:
-                messagebox.showinfo("Sucesso", message)
-                registrar_log(self.usuario_logado[0], f"Notebook {patrimonio} cadastrado.")
+            def concluido():
                 win.destroy()
-                self.atualizar_inventario()
-            else:
-                messagebox.showerror("Erro", message)
+                self.atualizar_notebook(patrimonio)
+
+            self.salvar_em_segundo_plano(lambda: adicionar_notebook(patrimonio, marca, modelo), dict(codigo=acoes.NOTEBOOK_CADASTRADO, patrimonio=patrimonio), concluido)
 
         ttk.Button(frame, text="Salvar", command=salvar).pack(pady=10, fill='x')
 
@@ -686,14 +1397,11 @@ class App:
                 messagebox.showwarning("Aviso", "Não é possível alterar o status de um notebook emprestado para manutenção ou estragado.")
                 return
 
-            success, message = editar_notebook_db(patrimonio, nova_marca, novo_modelo, novo_status)
-            if success:
-                messagebox.showinfo("Sucesso", message)
-                registrar_log(self.usuario_logado[0], f"Notebook {patrimonio} editado.")
+            def concluido():
                 win.destroy()
-                self.atualizar_inventario()
-            else:
-                messagebox.showerror("Erro", message)
+                self.atualizar_notebook(patrimonio)
+
+            self.salvar_em_segundo_plano(lambda: editar_notebook_db(patrimonio, nova_marca, novo_modelo, novo_status), dict(codigo=acoes.NOTEBOOK_EDITADO, patrimonio=patrimonio), concluido)
         
         ttk.Button(frame, text="Salvar Alterações", command=salvar_edicao).pack(pady=10, fill='x')
 
@@ -728,17 +1436,26 @@ class App:
                 messagebox.showwarning("Aviso", "Não é possível alterar o status de um notebook emprestado para manutenção ou estragado.")
                 return
 
-            atualizar_status_notebook(patrimonio, novo_status)
-            registrar_log(self.usuario_logado[0], f"Status do notebook {patrimonio} alterado para {novo_status}.")
-            messagebox.showinfo("Sucesso", f"Status do notebook {patrimonio} alterado para {novo_status}.")
-            win.destroy()
-            self.atualizar_inventario()
+            def operacao():
+                atualizar_status_notebook(patrimonio, novo_status)
+                return True, f"Status do notebook {patrimonio} alterado para {novo_status}."
+
+            def concluido():
+                win.destroy()
+                self.atualizar_notebook(patrimonio)
+
+            self.salvar_em_segundo_plano(operacao, dict(codigo=acoes.STATUS_NOTEBOOK, patrimonio=patrimonio, detalhe=novo_status), concluido)
 
         ttk.Button(frame, text="Salvar", command=salvar_status).pack(pady=10, fill='x')
 
 
 # Inicia a aplicação
 if __name__ == "__main__":
+    # Uso sem interface: ver emprestimo_dados.transferencia.main (python -m emprestimo_dados)
+    if len(sys.argv) > 1 and sys.argv[1].startswith('--'):
+        sys.exit(linha_de_comando(sys.argv[1:]))
+    if os.environ.get('EMPRESTIMO_LOG_ASSINCRONO') == '1':
+        iniciar_escritor_logs()
     root = ThemedTk(theme="azure")
     app = App(root)
     root.mainloop()
\ No newline at end of file